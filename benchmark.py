@@ -0,0 +1,235 @@
+import argparse
+import http.server
+import itertools
+import json
+import os
+import random
+import resource
+import subprocess
+import sys
+import tempfile
+import threading
+import time
+
+OUTPUT_EXTENSIONS = {
+    'csv': 'csv',
+    'json': 'json',
+    'jsonl': 'jsonl',
+    'sqlite': 'db',
+    'parquet': 'parquet',
+    'warc': 'warc',
+}
+
+WORDS = ('the crawler fetches pages from many hosts and parses links metadata and text before writing '
+         'each record to the configured output while respecting robots rules and per host delays').split()
+
+class SyntheticSite:
+    # Every page is derived from (seed, page number), so repeated runs crawl exactly the same site
+    def __init__(self, pages=500, fan_out=5, page_size=20000, latency=0.0, error_rate=0.0, hosts=4,
+                 crawl_delay=None, seed=0):
+        self.pages = pages
+        self.fan_out = fan_out
+        self.page_size = page_size
+        self.latency = latency
+        self.error_rate = error_rate
+        self.hosts = hosts
+        self.crawl_delay = crawl_delay
+        self.seed = seed
+        self.ports = []
+
+    def page_url(self, number):
+        return f'http://127.0.0.1:{self.ports[number % len(self.ports)]}/page/{number}.html'
+
+    def robots(self):
+        rules = 'User-agent: *\nDisallow: /private/\n'
+        if self.crawl_delay is not None:
+            rules += f'Crawl-delay: {self.crawl_delay}\n'
+        return rules
+
+    def render(self, number):
+        rng = random.Random(f'{self.seed}:{number}')
+        if number >= self.pages:
+            return 404, ''
+        if rng.random() < self.error_rate:
+            return 500, ''
+
+        children = range(number * self.fan_out + 1, min((number + 1) * self.fan_out + 1, self.pages))
+        links = [self.page_url(child) for child in children]
+        # Links the crawler must drop: already seen, disallowed by robots.txt, or an archive
+        links.append(self.page_url(rng.randrange(number + 1)))
+        links.append(f'/private/{number}.html')
+        links.append(f'/files/{number}.zip')
+
+        parts = [f'<html><head><title>Page {number}</title>'
+                 f'<meta name="description" content="Synthetic page {number}"></head><body>']
+        parts.extend(f'<a href="{link}">Link {i}</a>' for i, link in enumerate(links))
+        size = sum(len(part) for part in parts)
+        while size < self.page_size:
+            paragraph = '<p>' + ' '.join(rng.choice(WORDS) for _ in range(60)) + '</p>'
+            parts.append(paragraph)
+            size += len(paragraph)
+        parts.append('</body></html>')
+        return 200, ''.join(parts)
+
+class SyntheticSiteHandler(http.server.BaseHTTPRequestHandler):
+    protocol_version = 'HTTP/1.1'
+
+    def do_GET(self):
+        site = self.server.site
+        if site.latency:
+            time.sleep(site.latency)
+        if self.path == '/robots.txt':
+            status, body, content_type = 200, site.robots(), 'text/plain'
+        elif self.path.startswith('/page/') and self.path.endswith('.html') and self.path[6:-5].isdigit():
+            status, body = site.render(int(self.path[6:-5]))
+            content_type = 'text/html; charset=utf-8'
+        else:
+            status, body, content_type = 404, '', 'text/html'
+        body = body.encode('utf-8')
+        self.send_response(status)
+        self.send_header('Content-Type', content_type)
+        self.send_header('Content-Length', str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+
+    def log_message(self, format, *args):
+        pass
+
+def start_site(site):
+    servers = []
+    for _ in range(site.hosts):
+        server = http.server.ThreadingHTTPServer(('127.0.0.1', 0), SyntheticSiteHandler)
+        server.daemon_threads = True
+        server.site = site
+        threading.Thread(target=server.serve_forever, daemon=True).start()
+        servers.append(server)
+    site.ports = [server.server_port for server in servers]
+    return servers
+
+def run_crawl(config):
+    # Runs in a fresh interpreter so peak RSS and CPU belong to this crawl alone
+    from crawler import AdvancedWebCrawler
+
+    crawler = AdvancedWebCrawler(config)
+    started = time.perf_counter()
+    crawler.crawl()
+    elapsed = time.perf_counter() - started
+
+    own = resource.getrusage(resource.RUSAGE_SELF)
+    children = resource.getrusage(resource.RUSAGE_CHILDREN)
+    snapshot = crawler.metrics.snapshot()
+    return {
+        'pages': snapshot['pages'],
+        'fetch_errors': snapshot['fetch_errors'],
+        'seconds': elapsed,
+        'pages_per_second': snapshot['pages'] / elapsed if elapsed else 0.0,
+        'bytes_per_second': snapshot['bytes'] / elapsed if elapsed else 0.0,
+        # ru_maxrss is KiB on Linux
+        'peak_rss_mib': max(own.ru_maxrss, children.ru_maxrss) / 1024,
+        'cpu_seconds': own.ru_utime + own.ru_stime + children.ru_utime + children.ru_stime,
+        'stage_cpu_seconds': snapshot['stage_cpu_seconds'],
+        'stage_seconds': {stage: histogram['sum'] for stage, histogram in snapshot['stages'].items()},
+    }
+
+def run_benchmark(site, crawl_pattern, engine, output_format, args):
+    with tempfile.TemporaryDirectory() as temp_dir:
+        config = {
+            'url': site.page_url(0),
+            'depth': site.pages,
+            'breadth': site.fan_out + 3,
+            'delay': 0,
+            'crawl_pattern': crawl_pattern,
+            'engine': engine,
+            'threads': args.threads,
+            'concurrency': args.concurrency,
+            'output_format': output_format,
+            'output': os.path.join(temp_dir, f'output.{OUTPUT_EXTENSIONS[output_format]}'),
+            'log_file': os.path.join(temp_dir, 'crawl.log'),
+            'log_level': 'WARNING',
+            'state_file': os.path.join(temp_dir, 'state.pkl'),
+            'change_index': os.path.join(temp_dir, 'changes.db'),
+            'content_types': ['text/html'],
+            'parse_processes': args.parse_processes,
+            'plugin_dir': os.path.join(temp_dir, 'plugins'),
+        }
+        process = subprocess.run([sys.executable, os.path.abspath(__file__), '--run', json.dumps(config)],
+                                 capture_output=True, text=True, cwd=temp_dir)
+    if process.returncode != 0:
+        return {'error': process.stderr.strip().splitlines()[-1] if process.stderr.strip() else 'failed'}
+    return json.loads(process.stdout.splitlines()[-1])
+
+def format_row(name, result):
+    if 'error' in result:
+        return f'{name:<36} {result["error"]}'
+    cpu = result['stage_cpu_seconds']
+    return (f'{name:<36} {result["pages"]:>6} {result["pages_per_second"]:>8.1f} '
+            f'{result["bytes_per_second"] / 2 ** 20:>7.2f} {result["peak_rss_mib"]:>8.1f} {result["cpu_seconds"]:>7.2f} '
+            + ' '.join(f'{cpu.get(stage, 0):>8.2f}' for stage in ('fetch', 'parse', 'classify', 'output')))
+
+def compare(results, baseline, tolerance):
+    regressions = []
+    for name, result in results.items():
+        previous = baseline.get(name)
+        if previous is None or 'error' in result or 'error' in previous:
+            continue
+        if result['pages_per_second'] < previous['pages_per_second'] * (1 - tolerance):
+            regressions.append(f'{name}: {result["pages_per_second"]:.1f} pages/s, '
+                               f'baseline {previous["pages_per_second"]:.1f}')
+    return regressions
+
+def main():
+    parser = argparse.ArgumentParser(description='Benchmark the crawler against a local synthetic site')
+    parser.add_argument('--pages', type=int, default=500, help='Pages in the synthetic site (default: 500)')
+    parser.add_argument('--fan-out', type=int, default=5, help='New links per page (default: 5)')
+    parser.add_argument('--page-size', type=int, default=20000, help='Approximate page size in bytes (default: 20000)')
+    parser.add_argument('--latency', type=float, default=0.0, help='Server delay per request in seconds (default: 0)')
+    parser.add_argument('--error-rate', type=float, default=0.0, help='Fraction of pages answering 500 (default: 0)')
+    parser.add_argument('--hosts', type=int, default=4, help='Hosts (local ports) the site is spread over (default: 4)')
+    parser.add_argument('--crawl-delay', type=float, help='Crawl-delay to advertise in robots.txt')
+    parser.add_argument('--seed', type=int, default=0, help='Seed for the generated site (default: 0)')
+    parser.add_argument('--patterns', nargs='+', default=['breadth-first', 'depth-first'])
+    parser.add_argument('--engines', nargs='+', default=['threads', 'async'])
+    parser.add_argument('--formats', nargs='+', default=['csv', 'jsonl', 'sqlite'], choices=sorted(OUTPUT_EXTENSIONS))
+    parser.add_argument('--threads', type=int, default=10, help='Workers for the threads engine (default: 10)')
+    parser.add_argument('--concurrency', type=int, default=50, help='Connections for the async engine (default: 50)')
+    parser.add_argument('--parse-processes', type=int, default=0, help='Parse worker processes (default: 0)')
+    parser.add_argument('--json', help='Write results to this file')
+    parser.add_argument('--baseline', help='Results file from an earlier run to compare pages/s against')
+    parser.add_argument('--tolerance', type=float, default=0.1, help='Allowed pages/s drop against the baseline (default: 0.1)')
+    parser.add_argument('--run', help=argparse.SUPPRESS)
+    args = parser.parse_args()
+
+    if args.run:
+        print(json.dumps(run_crawl(json.loads(args.run))))
+        return
+
+    site = SyntheticSite(args.pages, args.fan_out, args.page_size, args.latency, args.error_rate, args.hosts,
+                         args.crawl_delay, args.seed)
+    servers = start_site(site)
+
+    print(f'{"run":<36} {"pages":>6} {"pages/s":>8} {"MiB/s":>7} {"RSS MiB":>8} {"CPU s":>7} '
+          f'{"fetch":>8} {"parse":>8} {"classify":>8} {"output":>8}')
+    results = {}
+    try:
+        for crawl_pattern, engine, output_format in itertools.product(args.patterns, args.engines, args.formats):
+            name = f'{crawl_pattern}/{engine}/{output_format}'
+            results[name] = run_benchmark(site, crawl_pattern, engine, output_format, args)
+            print(format_row(name, results[name]), flush=True)
+    finally:
+        for server in servers:
+            server.shutdown()
+            server.server_close()
+
+    if args.json:
+        with open(args.json, 'w') as f:
+            json.dump(results, f, indent=2)
+    if args.baseline:
+        with open(args.baseline) as f:
+            regressions = compare(results, json.load(f), args.tolerance)
+        for regression in regressions:
+            print(f'Regression: {regression}')
+        if regressions:
+            sys.exit(1)
+
+if __name__ == "__main__":
+    main()
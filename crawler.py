@@ -1,12 +1,34 @@
 import argparse
+import array
+import asyncio
+import bisect
+import codecs
+import collections
+import concurrent.futures
+import contextlib
 import csv
+import datetime
+import gzip
+import hashlib
+import heapq
+import http.server
+import itertools
 import json
 import logging
+import math
+import multiprocessing
 import os
 import pickle
+import queue
+import random
+import re
 import smtplib
+import socket
+import threading
 import time
 import urllib.parse
+import uuid
+import zlib
 
 import nltk
 import requests
@@ -17,28 +39,65 @@ import yaml
 from bs4 import BeautifulSoup
 from email.mime.text import MIMEText
 from nltk.classify import TextCat
+from selenium import webdriver
+from selenium.common.exceptions import WebDriverException
 from selenium.webdriver.chrome.options import Options
 from urllib.robotparser import RobotFileParser
 import importlib.util
 
+try:
+    import aiohttp
+except ImportError:
+    aiohttp = None
+
+try:
+    import pyarrow
+    import pyarrow.parquet
+except ImportError:
+    pyarrow = None
+
+try:
+    import zstandard
+except ImportError:
+    zstandard = None
+
 
 class AdvancedWebCrawler:
     def __init__(self, config):
         self.config = config
-        self.visited = set()
-        self.to_visit = [(config['url'], 0)]
+        self.visited = self.setup_seen_store()
         self.logger = self.setup_logger()
+        self.session = self.setup_session()
         self.rp = self.setup_robotparser()
+        self.finished_passes = 0
         self.output_handler = self.setup_output_handler()
         self.proxy_list = self.load_proxy_list()
-        self.current_proxy_index = 0
-        self.content_store = {}
-        nltk.download('punkt', quiet=True)
-        self.text_classifier = TextCat()
-        self.session = requests.Session()
-        self.session.headers.update({'User-Agent': self.config.get('user_agent', 'AdvancedWebCrawler/1.0')})
+        self.proxy_pool = self.setup_proxy_pool()
+        self.output_lock = threading.Lock()
+        self.change_index = self.setup_change_index()
+        self.state_file = self.config.get('state_file', 'crawler_state.pkl')
+        self.wal = None
+        # Fingerprints of self.visited already appended to the seen file; None until the file is started
+        self.seen_saved = None
+        self.last_checkpoint = time.monotonic()
+        self.recovered_done = set()
+        self.text_classifier = self.setup_text_classifier()
+        self.html_parser = self.config.get('html_parser') or default_html_parser()
+        self.parse_pool = None
+        self.browser_pool = self.setup_browser_pool()
+        self.metrics = CrawlMetrics(self.config.get('metrics_max_hosts', 1000))
+        self.metrics_server = None
+        self.last_metrics_report = time.monotonic()
         self.broken_links = []
         self.plugins = self.load_plugins()
+        self.plugin_pipeline = None
+        self.notifier = self.setup_notifier()
+        # The priority frontier scores URLs as they are pushed, so everything scoring reads is set up first
+        self.host_pages = collections.Counter()
+        self.scorer = URLScorer(self)
+        self.frontier = self.setup_frontier()
+        self.visited.add(config['url'])
+        self.frontier.push(config['url'], 0)
 
     def setup_logger(self):
         logger = logging.getLogger('advanced_web_crawler')
@@ -49,26 +108,61 @@ class AdvancedWebCrawler:
         logger.addHandler(handler)
         return logger
 
+    def setup_session(self):
+        session = requests.Session()
+        pool_size = self.config.get('threads', 5)
+        adapter = requests.adapters.HTTPAdapter(pool_connections=pool_size, pool_maxsize=pool_size)
+        session.mount('http://', adapter)
+        session.mount('https://', adapter)
+        session.headers.update({'User-Agent': self.config.get('user_agent', 'AdvancedWebCrawler/1.0')})
+        return session
+
     def setup_robotparser(self):
-        rp = RobotFileParser()
-        rp.set_url(urllib.parse.urljoin(self.config['url'], "/robots.txt"))
-        try:
-            rp.read()
-        except Exception as e:
-            self.logger.error(f"Error reading robots.txt: {e}")
-        return rp
+        return RobotsCache(
+            self.session,
+            self.logger,
+            ttl=self.config.get('robots_ttl', 86400),
+            error_ttl=self.config.get('robots_error_ttl', 300),
+            max_size=self.config.get('robots_cache_size', 10000),
+            timeout=self.config.get('timeout', 5),
+        )
 
     def setup_output_handler(self):
         output_format = self.config.get('output_format', 'csv')
         if output_format == 'csv':
-            return CSVOutputHandler(self.config['output'])
+            return CSVOutputHandler(self.output_filename())
         elif output_format == 'json':
-            return JSONOutputHandler(self.config['output'])
+            return JSONOutputHandler(self.output_filename())
+        elif output_format == 'jsonl':
+            return JSONLinesOutputHandler(self.output_filename(), **self.output_file_options())
+        elif output_format == 'parquet':
+            return ParquetOutputHandler(self.output_filename(), row_group_size=self.config.get('output_row_group_size', 10000),
+                                        **self.output_file_options())
+        elif output_format == 'warc':
+            return WARCOutputHandler(self.output_filename(), **self.output_file_options())
         elif output_format == 'sqlite':
-            return SQLiteOutputHandler(self.config['output'])
+            return SQLiteOutputHandler(
+                self.config['output'],
+                batch_size=self.config.get('output_batch_size', 500),
+                flush_interval=self.config.get('output_flush_interval', 1.0),
+            )
         else:
             raise ValueError(f"Unsupported output format: {output_format}")
 
+    def output_filename(self):
+        # Scheduled re-runs write to their own file rather than truncating the previous pass. Pages that
+        # answer 304 are not written again, so each later file holds only pages that are new or changed.
+        # SQLite output is keyed by URL and keeps accumulating in one database instead.
+        if self.finished_passes == 0:
+            return self.config['output']
+        return pass_filename(self.config['output'], self.finished_passes + 1)
+
+    def output_file_options(self):
+        return {
+            'compression': self.config.get('output_compression'),
+            'max_bytes': self.config.get('output_max_bytes'),
+        }
+
     def load_proxy_list(self):
         proxy_file = self.config.get('proxy_list')
         if proxy_file:
@@ -76,75 +170,338 @@ class AdvancedWebCrawler:
                 return f.read().splitlines()
         return []
 
-    def get_next_proxy(self):
+    def setup_proxy_pool(self):
         if not self.proxy_list:
             return None
-        proxy = self.proxy_list[self.current_proxy_index]
-        self.current_proxy_index = (self.current_proxy_index + 1) % len(self.proxy_list)
-        return proxy
+        return ProxyPool(
+            self.proxy_list,
+            session_factory=self.setup_session,
+            failure_threshold=self.config.get('proxy_failure_threshold', 3),
+            base_backoff=self.config.get('proxy_backoff', 30),
+            max_backoff=self.config.get('proxy_max_backoff', 600),
+            error_penalty=self.config.get('proxy_error_penalty', 5),
+        )
+
+    def proxy_attempts(self):
+        # Each failed attempt moves on to a different proxy; without proxies there is nothing to switch to
+        if self.proxy_pool is None:
+            return 1
+        return min(len(self.proxy_list), self.config.get('proxy_retries', 2) + 1)
+
+    def record_proxy_failure(self, proxy, url, error):
+        if self.proxy_pool.record_failure(proxy):
+            self.logger.warning(f"Ejected proxy {proxy} after repeated failures")
+        self.logger.warning(f"Proxy {proxy} failed for {url}: {error}")
 
     def process_url(self, url, depth):
-        if url is None or not self.rp.can_fetch("*", url):
+        if url is None or not self.is_allowed_extension(url) or not self.rp.can_fetch("*", url):
             return [], None
 
-        proxy = self.get_next_proxy()
+        revisit = self.get_revisit(url)
+        if self.is_revisit_due(revisit) is False:
+            return self.filter_links(revisit['links']), None
+
+        headers, status = {}, None
+        render_js = self.config.get('render_js', False)
         try:
-            if self.config.get('render_js', False):
+            if render_js is True:
                 content, title = self.fetch_with_javascript(url)
             else:
-                response = self.session.get(url, timeout=5, proxies={'http': proxy, 'https': proxy})
-                response.raise_for_status()
-                content = response.text
-                content_type = response.headers.get('content-type', '').split(';')[0]
-                if not self.is_allowed_content_type(content_type):
+                fetched = self.fetch_with_proxies(url, revisit)
+                if fetched is None:
                     return [], None
-                soup = BeautifulSoup(content, 'html.parser')
-                title = soup.title.string if soup.title else 'No title'
+                if fetched is NOT_MODIFIED:
+                    return self.handle_not_modified(url, revisit)
+                content, headers, status = fetched
+                title = None
+                if render_js == 'auto' and looks_js_dependent(content):
+                    content, title, status = self.render_static_fallback(url, content, status)
         except requests.exceptions.RequestException as e:
+            if self.proxy_pool is not None and is_proxy_failure(e):
+                # Every proxy tried failed; that says nothing about the link itself
+                self.logger.error(f"Error processing {url}, no working proxy: {e}")
+                self.metrics.increment('proxy_errors')
+                return [], None
             self.logger.error(f"Error processing {url}: {e}")
             self.broken_links.append((url, str(e)))
+            self.metrics.increment('fetch_errors')
             return [], None
+        except WebDriverException as e:
+            self.logger.error(f"Error rendering {url}: {e.msg}")
+            return [], None
+        except ResponseTooLarge as e:
+            self.logger.warning(f"Skipping {url}: {e}")
+            return [], None
+
+        return self.process_content(url, content, title, headers, status)
+
+    def fetch_with_proxies(self, url, revisit):
+        tried = []
+        for attempt in range(self.proxy_attempts()):
+            proxy = self.proxy_pool.choose(exclude=tried) if self.proxy_pool is not None else None
+            session = self.proxy_pool.session(proxy) if proxy is not None else self.session
+            started = time.perf_counter()
+            try:
+                fetched = self.fetch_once(session, url, revisit)
+            except requests.exceptions.RequestException as e:
+                if proxy is None or not is_proxy_failure(e):
+                    raise
+                self.record_proxy_failure(proxy, url, e)
+                tried.append(proxy)
+                if attempt + 1 == self.proxy_attempts():
+                    raise
+                continue
+            if proxy is not None:
+                self.proxy_pool.record_success(proxy, time.perf_counter() - started)
+            return fetched
+
+    def fetch_once(self, session, url, revisit):
+        # Returns (content, headers, status), NOT_MODIFIED, or None when the response is rejected by its headers
+        timeout = self.config.get('timeout', 5)
+        if self.config.get('head_precheck', False):
+            head = session.head(url, timeout=timeout, allow_redirects=True)
+            if head.ok and not self.is_allowed_response(url, head.headers):
+                return None
+        # Stream the body so disallowed or oversized responses are dropped after the headers
+        started, cpu_started = time.perf_counter(), time.thread_time()
+        response = session.get(url, timeout=timeout, headers=self.conditional_headers(revisit), stream=True)
+        try:
+            if response.status_code == 304:
+                self.metrics.observe_fetch(url, time.perf_counter() - started, 0, time.thread_time() - cpu_started)
+                return NOT_MODIFIED
+            response.raise_for_status()
+            if not self.is_allowed_response(url, response.headers):
+                return None
+            decoder = BodyDecoder(response.headers.get('content-type', ''), self.max_body_size())
+            for chunk in response.iter_content(chunk_size=65536):
+                decoder.feed(chunk)
+            content = decoder.finish()
+            self.metrics.observe_fetch(url, time.perf_counter() - started, decoder.size, time.thread_time() - cpu_started)
+        finally:
+            response.close()
+        return content, response.headers, response.status_code
+
+    async def process_url_async(self, session, url, depth):
+        if url is None or not self.is_allowed_extension(url):
+            return [], None
+
+        loop = asyncio.get_running_loop()
+        # The robots cache may need to fetch robots.txt for a new host, which blocks
+        if not await loop.run_in_executor(None, self.rp.can_fetch, "*", url):
+            return [], None
+
+        revisit = await loop.run_in_executor(None, self.get_revisit, url)
+        if self.is_revisit_due(revisit) is False:
+            return self.filter_links(revisit['links']), None
+
+        headers, status = {}, None
+        render_js = self.config.get('render_js', False)
+        try:
+            if render_js is True:
+                content, title = await loop.run_in_executor(None, self.fetch_with_javascript, url)
+            else:
+                fetched = await self.fetch_with_proxies_async(session, url, revisit)
+                if fetched is None:
+                    return [], None
+                if fetched is NOT_MODIFIED:
+                    return await loop.run_in_executor(None, self.handle_not_modified, url, revisit)
+                content, headers, status = fetched
+                title = None
+                if render_js == 'auto' and looks_js_dependent(content):
+                    content, title, status = await loop.run_in_executor(None, self.render_static_fallback, url, content, status)
+        except (aiohttp.ClientError, asyncio.TimeoutError) as e:
+            if self.proxy_pool is not None and is_proxy_failure(e):
+                self.logger.error(f"Error processing {url}, no working proxy: {e!r}")
+                self.metrics.increment('proxy_errors')
+                return [], None
+            self.logger.error(f"Error processing {url}: {e!r}")
+            self.broken_links.append((url, repr(e)))
+            self.metrics.increment('fetch_errors')
+            return [], None
+        except WebDriverException as e:
+            self.logger.error(f"Error rendering {url}: {e.msg}")
+            return [], None
+        except ResponseTooLarge as e:
+            self.logger.warning(f"Skipping {url}: {e}")
+            return [], None
+
+        # Parsing and output are blocking, so keep them off the event loop
+        return await loop.run_in_executor(None, self.process_content, url, content, title, headers, status)
+
+    async def fetch_with_proxies_async(self, session, url, revisit):
+        # aiohttp already keeps a separate connection pool per proxy inside the one ClientSession
+        tried = []
+        for attempt in range(self.proxy_attempts()):
+            proxy = self.proxy_pool.choose(exclude=tried) if self.proxy_pool is not None else None
+            started = time.perf_counter()
+            try:
+                fetched = await self.fetch_once_async(session, url, revisit, proxy)
+            except (aiohttp.ClientError, asyncio.TimeoutError) as e:
+                if proxy is None or not is_proxy_failure(e):
+                    raise
+                self.record_proxy_failure(proxy, url, repr(e))
+                tried.append(proxy)
+                if attempt + 1 == self.proxy_attempts():
+                    raise
+                continue
+            if proxy is not None:
+                self.proxy_pool.record_success(proxy, time.perf_counter() - started)
+            return fetched
+
+    async def fetch_once_async(self, session, url, revisit, proxy):
+        if self.config.get('head_precheck', False):
+            async with session.head(url, proxy=proxy, allow_redirects=True) as head:
+                if head.ok and not self.is_allowed_response(url, head.headers):
+                    return None
+        started = time.perf_counter()
+        async with session.get(url, proxy=proxy, headers=self.conditional_headers(revisit)) as response:
+            if response.status == 304:
+                self.metrics.observe_fetch(url, time.perf_counter() - started, 0)
+                return NOT_MODIFIED
+            response.raise_for_status()
+            if not self.is_allowed_response(url, response.headers):
+                return None
+            decoder = BodyDecoder(response.headers.get('content-type', ''), self.max_body_size())
+            async for chunk in response.content.iter_chunked(65536):
+                decoder.feed(chunk)
+            content = decoder.finish()
+        self.metrics.observe_fetch(url, time.perf_counter() - started, decoder.size)
+        return content, response.headers, response.status
+
+    def process_content(self, url, content, title=None, headers=None, status=None):
+        # Parse once; title, links, meta tags and text all come from the same tree
+        page, category = self.analyze_and_categorize(url, content)
+        if title is None:
+            title = page.title
 
-        self.visited.add(url)
         self.logger.info(f"Crawled {url}, title: {title}")
+        self.metrics.increment('pages')
 
-        if self.should_detect_changes(url, content):
+        with self.metrics.time_stage('change_detection'):
+            changed = self.should_detect_changes(url, content, page.text)
+            headers = headers or {}
+            self.change_index.record_revisit(url, headers.get('ETag'), headers.get('Last-Modified'), page.links, changed)
+        if changed:
             self.notify_change(url, title)
 
-        new_links = self.extract_links(url, content)
-        metadata = self.extract_metadata(content)
-        category = self.categorize_content(content)
+        if isinstance(self.frontier, PriorityFrontier):
+            self.frontier.note_links(page.links)
+        new_links = self.filter_links(page.links)
+
+        if self.config.get('skip_near_duplicates', False):
+            duplicate_of = self.change_index.find_near_duplicate(url, simhash(page.text))
+            if duplicate_of is not None:
+                self.logger.info(f"Skipping output for {url}, near-duplicate of {duplicate_of}")
+                return new_links, title
 
         # Apply plugins
-        for plugin in self.plugins:
-            plugin.process(url, content, metadata, category)
+        with self.metrics.time_stage('plugins'):
+            if self.plugin_pipeline is not None:
+                # Plugins run on their own threads; this only waits when a plugin's queue is full
+                self.plugin_pipeline.submit(url, content, page, category)
+            else:
+                for plugin in self.plugins:
+                    for error in run_plugin(plugin, [(url, content, page, category)]):
+                        self.logger.error(f"Plugin {type(plugin).__module__} failed: {error!r}")
+                        self.metrics.increment('plugin_errors')
 
-        self.output_handler.write(url, title, metadata, content, category)
+        # Without a status the content did not come straight from a response, e.g. it was rendered in a browser
+        response = (status, headers) if status is not None else None
+        with self.metrics.time_stage('output'), self.output_lock:
+            self.output_handler.write(url, title, page.metadata, content, category, response)
+        if self.config.get('skip_near_duplicates', False):
+            self.change_index.mark_written(url)
 
-        time.sleep(self.config.get('delay', 1))
         return new_links, title
 
+    def analyze_page(self, url, content):
+        return analyze_html(url, content, self.html_parser)
+
+    def get_revisit(self, url):
+        # A 304 or a skipped revisit writes nothing for the page, which only loses nothing when its earlier
+        # output is kept: later scheduled passes, or runs told so with revalidate
+        if not (self.config.get('revalidate', False) or self.finished_passes):
+            return None
+        return self.change_index.get_revisit(url)
+
+    def is_revisit_due(self, revisit):
+        if revisit is None or not self.config.get('adaptive_revisit', False):
+            return None
+        return revisit['next_visit'] <= time.time()
+
+    def conditional_headers(self, revisit):
+        headers = {}
+        if revisit is not None:
+            if revisit['etag']:
+                headers['If-None-Match'] = revisit['etag']
+            if revisit['last_modified']:
+                headers['If-Modified-Since'] = revisit['last_modified']
+        return headers
+
+    def handle_not_modified(self, url, revisit):
+        # Nothing to parse, classify or write; follow the links remembered from the last full fetch
+        self.logger.info(f"Not modified: {url}")
+        self.metrics.increment('not_modified')
+        self.change_index.record_not_modified(url)
+        return self.filter_links(revisit['links']), None
+
+    def analyze_and_categorize(self, url, content):
+        if self.parse_pool is not None:
+            # Parsing and classification are CPU bound; hand them to another process to escape the GIL
+            page, category, timings = self.parse_pool.submit(analyze_and_categorize, url, content, self.html_parser).result()
+            for stage, (seconds, cpu_seconds) in zip(('parse', 'classify'), timings):
+                self.metrics.observe_stage(stage, seconds, cpu_seconds)
+            return page, category
+        with self.metrics.time_stage('parse'):
+            page = self.analyze_page(url, content)
+        with self.metrics.time_stage('classify'):
+            return page, self.categorize_text(page.text)
+
+    def setup_parse_pool(self):
+        processes = self.config.get('parse_processes', 0)
+        if not processes:
+            return None
+        # Workers start lazily from fetch threads while writer, metrics and plugin threads hold locks, so
+        # they must not be forked from this process
+        start_method = 'forkserver' if 'forkserver' in multiprocessing.get_all_start_methods() else 'spawn'
+        return concurrent.futures.ProcessPoolExecutor(max_workers=processes, initializer=init_parse_worker,
+                                                      initargs=self.text_classifier_options(),
+                                                      mp_context=multiprocessing.get_context(start_method))
+
+    def setup_text_classifier(self):
+        return TextClassifier(load_language_profiles(), *self.text_classifier_options())
+
+    def text_classifier_options(self):
+        return self.config.get('classify_sample_chars', 2000), self.config.get('classify_cache_size', 10000)
+
+    def setup_browser_pool(self):
+        if not self.config.get('render_js', False):
+            return None
+        return BrowserPool(
+            size=self.config.get('browser_pool_size', 2),
+            max_pages=self.config.get('browser_max_pages', 100),
+            page_timeout=self.config.get('browser_page_timeout', 30),
+            idle_time=self.config.get('browser_idle_time', 0.5),
+        )
+
     def fetch_with_javascript(self, url):
-        options = Options()
-        options.add_argument('--headless')
-        driver = webdriver.Chrome(options=options)
-        driver.get(url)
-        time.sleep(5)  # Wait for JavaScript to render
-        content = driver.page_source
-        title = driver.title
-        driver.quit()
-        return content, title
+        with self.metrics.time_stage('render'):
+            return self.browser_pool.fetch(url)
+
+    def render_static_fallback(self, url, content, status):
+        # The static HTML is still usable if the browser fails, so don't drop the page. The rendered page
+        # is not what the server sent, so it comes back without the response status.
+        try:
+            return self.fetch_with_javascript(url) + (None,)
+        except WebDriverException as e:
+            self.logger.warning(f"Rendering {url} failed, using static HTML: {e.msg}")
+            return content, None, status
 
     def extract_links(self, base_url, content):
-        soup = BeautifulSoup(content, 'html.parser')
-        new_links = []
-        for link in soup.find_all('a'):
-            href = link.get('href')
-            if href and not href.startswith(('mailto:', 'tel:', 'javascript:')):
-                full_url = urllib.parse.urljoin(base_url, href)
-                if full_url not in self.visited and self.is_allowed_url(full_url):
-                    new_links.append(full_url)
-        return new_links
+        return self.filter_links(self.analyze_page(base_url, content).links)
+
+    def filter_links(self, links):
+        return [link for link in links if link not in self.visited and self.is_allowed_url(link)]
 
     def is_allowed_url(self, url):
         for pattern in self.config.get('exclude_patterns', []):
@@ -158,99 +515,480 @@ class AdvancedWebCrawler:
             return True
         return any(allowed_type in content_type for allowed_type in allowed_types)
 
+    def is_allowed_extension(self, url):
+        # Skip obvious media and archives by their extension without a request; anything else is fetched
+        # and judged by its Content-Type
+        extension = os.path.splitext(urllib.parse.urlsplit(url).path)[1].lower()
+        media_type = MEDIA_EXTENSIONS.get(extension)
+        return media_type is None or self.is_allowed_content_type(media_type)
+
+    def is_allowed_response(self, url, headers):
+        content_type = headers.get('content-type', '').split(';')[0]
+        if not self.is_allowed_content_type(content_type):
+            return False
+        max_size = self.max_body_size()
+        length = headers.get('content-length')
+        if max_size and length and length.isdigit() and int(length) > max_size:
+            raise ResponseTooLarge(f"Content-Length {length} exceeds max_body_size {max_size}")
+        return True
+
+    def max_body_size(self):
+        return self.config.get('max_body_size', 10 * 1024 * 1024)
+
     def extract_metadata(self, content):
-        soup = BeautifulSoup(content, 'html.parser')
-        metadata = {}
-        for meta in soup.find_all('meta'):
-            key = meta.get('name') or meta.get('property')
-            if key:
-                metadata[key] = meta.get('content')
-        return metadata
+        return self.analyze_page(self.config['url'], content).metadata
 
     def categorize_content(self, content):
-        text = BeautifulSoup(content, 'html.parser').get_text()
+        return self.categorize_text(self.analyze_page(self.config['url'], content).text)
+
+    def categorize_text(self, text):
         return self.text_classifier.classify(text)
 
-    def should_detect_changes(self, url, content):
-        if url in self.content_store:
-            return content != self.content_store[url]
-        self.content_store[url] = content
-        return False
+    def setup_change_index(self):
+        return ChangeIndex(
+            self.config.get('change_index', 'change_index.db'),
+            self.config.get('change_threshold', 3),
+            revisit_interval=self.config.get('revisit_interval', 86400),
+            min_revisit_interval=self.config.get('min_revisit_interval', 3600),
+            max_revisit_interval=self.config.get('max_revisit_interval', 30 * 86400),
+        )
+
+    def should_detect_changes(self, url, content, text=None):
+        content_hash, text_hash = content_signature(content, content if text is None else text)
+        return self.change_index.record(url, content_hash, text_hash)
+
+    def setup_notifier(self):
+        if 'notification_email' not in self.config:
+            return None
+        return ChangeNotifier(
+            self.config['notification_email'],
+            self.logger,
+            digest_interval=self.config.get('notification_digest_interval', 300),
+            digest_size=self.config.get('notification_digest_size', 100),
+            smtp_host=self.config.get('smtp_host', 'localhost'),
+            smtp_port=self.config.get('smtp_port', 25),
+        )
 
     def notify_change(self, url, title):
-        if 'notification_email' in self.config:
-            subject = f"Content change detected: {title}"
-            body = f"The content at {url} has changed."
-            self.send_email(subject, body)
+        if self.notifier is not None:
+            self.notifier.notify(url, title)
 
     def send_email(self, subject, body):
-        msg = MIMEText(body)
-        msg['Subject'] = subject
-        msg['From'] = "crawler@example.com"
-        msg['To'] = self.config['notification_email']
-        
-        s = smtplib.SMTP('localhost')
-        s.send_message(msg)
-        s.quit()
+        if self.notifier is None:
+            self.notifier = self.setup_notifier()
+        self.notifier.send(subject, body)
+
+    def setup_plugin_pipeline(self):
+        if not self.plugins:
+            return None
+        return PluginPipeline(
+            self.plugins,
+            self.logger,
+            self.metrics,
+            queue_size=self.config.get('plugin_queue_size', 256),
+            batch_size=self.config.get('plugin_batch_size', 50),
+            flush_interval=self.config.get('plugin_flush_interval', 1.0),
+            concurrency=self.config.get('plugin_concurrency', 10),
+        )
 
     def crawl(self):
+        if self.finished_passes and not self.frontier:
+            self.start_new_pass()
+        self.metrics.start_pass()
+
         crawl_pattern = self.config.get('crawl_pattern', 'breadth-first')
         if crawl_pattern == 'breadth-first':
             self.crawl_breadth_first()
         elif crawl_pattern == 'depth-first':
             self.crawl_depth_first()
+        elif crawl_pattern == 'priority':
+            self.crawl_priority()
         else:
             raise ValueError(f"Unsupported crawl pattern: {crawl_pattern}")
 
-        self.output_handler.close()
         self.save_state()
+        self.output_handler.close()
         self.report_broken_links()
+        self.report_metrics()
+        if self.notifier is not None:
+            # Mail what is left as a final digest and release the SMTP connection until the next pass
+            self.notifier.close()
+        self.finished_passes += 1
+
+    def start_new_pass(self):
+        # A scheduled re-run after a finished crawl; revalidate everything from the start URL
+        self.visited = self.setup_seen_store()
+        self.seen_saved = None
+        self.host_pages.clear()
+        if isinstance(self.frontier, SQLiteFrontier):
+            self.frontier.generation = self.finished_passes
+        self.visited.add(self.config['url'])
+        self.frontier.push(self.config['url'], 0)
+        self.output_handler = self.setup_output_handler()
 
     def crawl_breadth_first(self):
-        with concurrent.futures.ThreadPoolExecutor(max_workers=self.config.get('threads', 5)) as executor:
-            while self.to_visit:
-                current_url, current_depth = self.to_visit.pop(0)
-                if current_depth > self.config['depth']:
-                    continue
+        self.run_frontier(lifo=False)
+
+    def crawl_depth_first(self):
+        self.run_frontier(lifo=True)
 
-                future = executor.submit(self.process_url, current_url, current_depth)
-                new_links, _ = future.result()
+    def crawl_priority(self):
+        # The priority frontier ignores lifo and always pops the highest-scoring URL
+        self.run_frontier(lifo=False)
 
-                for link in new_links[:self.config.get('breadth', 100)]:
-                    self.to_visit.append((link, current_depth + 1))
+    def run_frontier(self, lifo):
+        engine = self.config.get('engine', 'threads')
+        if engine not in ('threads', 'async'):
+            raise ValueError(f"Unsupported engine: {engine}")
 
-    def crawl_depth_first(self):
-        with concurrent.futures.ThreadPoolExecutor(max_workers=self.config.get('threads', 5)) as executor:
-            while self.to_visit:
-                current_url, current_depth = self.to_visit.pop()
-                if current_depth > self.config['depth']:
+        self.parse_pool = self.setup_parse_pool()
+        self.plugin_pipeline = self.setup_plugin_pipeline()
+        self.metrics_server = self.setup_metrics_server()
+        self.wal = open(self.state_file + '.wal', 'a')
+        try:
+            if engine == 'threads':
+                self.run_frontier_threaded(lifo)
+            else:
+                asyncio.run(self.run_frontier_async(lifo))
+        finally:
+            self.wal.close()
+            self.wal = None
+            if self.plugin_pipeline is not None:
+                # Lets plugins finish everything queued before the crawl reports it is done
+                self.plugin_pipeline.close()
+                self.plugin_pipeline = None
+            if self.parse_pool is not None:
+                self.parse_pool.shutdown()
+                self.parse_pool = None
+            if self.browser_pool is not None:
+                self.browser_pool.close()
+            if self.metrics_server is not None:
+                self.metrics_server.shutdown()
+                self.metrics_server.server_close()
+                self.metrics_server = None
+
+    def run_frontier_threaded(self, lifo):
+        max_workers = self.config.get('threads', 5)
+        scheduler = self.setup_scheduler()
+        in_flight = {}
+        with concurrent.futures.ThreadPoolExecutor(max_workers=max_workers) as executor:
+            def submit(url, depth):
+                return executor.submit(self.process_url, url, depth)
+
+            while in_flight or scheduler or self.frontier:
+                wait_timeout = self.dispatch_ready(scheduler, lifo, in_flight, max_workers, submit)
+                if not in_flight:
+                    time.sleep(self.idle_timeout(wait_timeout))
                     continue
 
-                future = executor.submit(self.process_url, current_url, current_depth)
-                new_links, _ = future.result()
+                futures = {future: url for url, (future, _) in in_flight.items()}
+                done, _ = concurrent.futures.wait(futures, timeout=wait_timeout, return_when=concurrent.futures.FIRST_COMPLETED)
+                for future in done:
+                    current_url = futures[future]
+                    _, current_depth = in_flight.pop(current_url)
+                    scheduler.release(current_url, time.monotonic())
+                    new_links, _ = future.result()
+                    self.finish_url(current_url, current_depth, new_links, lifo)
+                self.maybe_checkpoint(scheduler, in_flight)
+                self.maybe_report_metrics(scheduler, in_flight)
+
+    async def run_frontier_async(self, lifo):
+        if aiohttp is None:
+            raise ImportError("The async engine requires aiohttp to be installed")
+
+        concurrency = self.config.get('concurrency', 100)
+        connector = aiohttp.TCPConnector(limit=concurrency, limit_per_host=self.config.get('connections_per_host', 0))
+        timeout = aiohttp.ClientTimeout(total=self.config.get('timeout', 5))
+        headers = {'User-Agent': self.config.get('user_agent', 'AdvancedWebCrawler/1.0')}
+        scheduler = self.setup_scheduler()
+        in_flight = {}
+        async with aiohttp.ClientSession(connector=connector, timeout=timeout, headers=headers) as session:
+            def submit(url, depth):
+                return asyncio.create_task(self.process_url_async(session, url, depth))
+
+            # Fetches interleave on the event loop thread, so per-fetch thread CPU is meaningless; the loop
+            # thread's CPU (HTTP, TLS, decoding and dispatch) is charged to the fetch stage as a whole
+            cpu_mark = time.thread_time()
+            try:
+                while in_flight or scheduler or self.frontier:
+                    wait_timeout = self.dispatch_ready(scheduler, lifo, in_flight, concurrency, submit)
+                    if not in_flight:
+                        await asyncio.sleep(self.idle_timeout(wait_timeout))
+                        continue
+
+                    tasks = {task: url for url, (task, _) in in_flight.items()}
+                    done, _ = await asyncio.wait(tasks, timeout=wait_timeout, return_when=asyncio.FIRST_COMPLETED)
+                    for task in done:
+                        current_url = tasks[task]
+                        _, current_depth = in_flight.pop(current_url)
+                        scheduler.release(current_url, time.monotonic())
+                        new_links, _ = task.result()
+                        self.finish_url(current_url, current_depth, new_links, lifo)
+                    self.metrics.add_stage_cpu('fetch', time.thread_time() - cpu_mark)
+                    self.maybe_checkpoint(scheduler, in_flight)
+                    self.maybe_report_metrics(scheduler, in_flight)
+                    cpu_mark = time.thread_time()
+            finally:
+                self.metrics.add_stage_cpu('fetch', time.thread_time() - cpu_mark)
+
+    def setup_scheduler(self):
+        return HostScheduler(self.get_crawl_delay, self.config.get('scheduler_queue_size', 10000))
+
+    def setup_seen_store(self, urls=()):
+        store_type = self.config.get('seen_store', 'exact')
+        if store_type == 'exact':
+            store = URLSeenStore()
+        elif store_type == 'bloom':
+            store = BloomURLSeenStore(self.config.get('bloom_capacity', 1000000), self.config.get('bloom_error_rate', 0.001))
+        else:
+            raise ValueError(f"Unsupported seen store: {store_type}")
+        for url in urls:
+            store.add(url)
+        return store
+
+    def setup_frontier(self):
+        backend = self.config.get('frontier', 'memory')
+        if self.config.get('crawl_pattern') == 'priority':
+            if backend != 'memory':
+                raise ValueError(f"The priority crawl pattern needs the memory frontier, not {backend}")
+            return PriorityFrontier(self.scorer.score)
+        if backend == 'memory':
+            return MemoryFrontier()
+        elif backend == 'disk':
+            return DiskFrontier(self.config.get('frontier_path', 'frontier'), self.config.get('frontier_segment_size', 10000))
+        elif backend == 'sqlite':
+            return SQLiteFrontier(
+                self.config.get('frontier_path', 'frontier.db'),
+                node_id=self.config.get('node_id', 0),
+                nodes=self.config.get('nodes', 1),
+                lease_timeout=self.config.get('lease_timeout', 300),
+            )
+        else:
+            raise ValueError(f"Unsupported frontier backend: {backend}")
+
+    def get_crawl_delay(self, url):
+        return max(self.config.get('delay', 1), self.rp.crawl_delay("*", url) or 0)
+
+    def idle_timeout(self, wait_timeout):
+        if wait_timeout is None and self.frontier:
+            # Nothing is ready for this node, but other nodes still hold leases that may produce work
+            return self.config.get('frontier_poll_interval', 1)
+        return wait_timeout or 0
+
+    def dispatch_ready(self, scheduler, lifo, in_flight, capacity, submit):
+        # Move frontier entries into per-host queues, then start every host whose delay has elapsed
+        lookahead = self.scheduler_lookahead(lifo, capacity)
+        while not scheduler.is_full() and (lookahead is None or len(scheduler) + len(in_flight) < lookahead):
+            entry = self.frontier.pop(lifo)
+            if entry is None:
+                break
+            current_url, current_depth = entry
+            if (self.should_dispatch(current_url, current_depth, in_flight) and current_url not in scheduler
+                    and self.take_host_budget(current_url)):
+                scheduler.add(current_url, current_depth)
+            else:
+                self.frontier.ack(current_url)
+
+        while len(in_flight) < capacity:
+            entry = scheduler.pop_ready(time.monotonic())
+            if entry is None:
+                break
+            current_url, current_depth = entry
+            in_flight[current_url] = (submit(current_url, current_depth), current_depth)
 
-                for link in reversed(new_links[:self.config.get('breadth', 100)]):
-                    self.to_visit.append((link, current_depth + 1))
+        # Only wake up early for the next host if there is a free slot to run it in
+        if len(in_flight) < capacity:
+            return scheduler.time_until_ready(time.monotonic())
+        return None
 
-    def save_state(self):
+    def scheduler_lookahead(self, lifo, capacity):
+        # Per-host FIFO queues keep breadth-first order, so BFS can pull far ahead to find hosts whose delay
+        # has elapsed. Depth-first and priority order only hold if URLs leave the frontier once a slot is free
+        # to run them; otherwise children found later queue behind siblings that are already scheduled, and
+        # better links found later, or rescored by new in-links, wait behind worse ones.
+        if lifo or isinstance(self.frontier, PriorityFrontier):
+            return capacity
+        return None
+
+    def should_dispatch(self, url, depth, in_flight):
+        # Frontier entries were deduplicated against self.visited when they were enqueued, so a URL the
+        # write-ahead log recorded as done is popped exactly once and can be forgotten then
+        if url in self.recovered_done:
+            self.recovered_done.discard(url)
+            return False
+        return depth <= self.config['depth'] and url not in in_flight
+
+    def take_host_budget(self, url):
+        host = urllib.parse.urlsplit(url).netloc
+        budget = self.config.get('host_page_budget')
+        if budget is not None and self.host_pages[host] >= budget:
+            self.metrics.increment('over_budget')
+            return False
+        self.host_pages[host] += 1
+        return True
+
+    def finish_url(self, url, depth, new_links, lifo):
+        for link in self.enqueue_links(new_links, depth + 1, lifo):
+            self.log_wal('enqueue', link, depth + 1)
+        self.log_wal('done', url)
+        self.frontier.ack(url)
+
+    def enqueue_links(self, links, depth, lifo=False):
+        if depth > self.config['depth']:
+            return []
+        breadth = self.config.get('breadth', 100)
+        if isinstance(self.frontier, PriorityFrontier) and len(links) > breadth:
+            # Keep the most valuable links rather than whichever come first in the HTML
+            links = sorted(links, key=lambda link: self.frontier.score_link(link, depth), reverse=True)
+        links = links[:breadth]
+        enqueued = []
+        # A LIFO frontier pops the last push first, so push in reverse to visit links in page order
+        for link in reversed(links) if lifo else links:
+            if self.visited.add(link):
+                self.frontier.push(link, depth)
+                enqueued.append(link)
+        return enqueued
+
+    def log_wal(self, *record):
+        if self.wal is not None:
+            self.wal.write(json.dumps(record) + '\n')
+
+    def maybe_checkpoint(self, scheduler, in_flight):
+        self.wal.flush()
+        if time.monotonic() - self.last_checkpoint >= self.config.get('checkpoint_interval', 60):
+            # URLs already taken off the frontier must be re-queued on resume if they never finished
+            pending = scheduler.entries() + [(url, depth) for url, (_, depth) in in_flight.items()]
+            self.save_state(pending)
+
+    def maybe_report_metrics(self, scheduler, in_flight):
+        if time.monotonic() - self.last_metrics_report < self.config.get('metrics_interval', 5):
+            return
+        # Gauges are sampled here on the crawl thread; the SQLite frontier can't be queried from the server thread
+        self.metrics.set_gauge('frontier_size', len(self.frontier))
+        self.metrics.set_gauge('scheduler_size', len(scheduler))
+        self.metrics.set_gauge('in_flight', len(in_flight))
+        if self.proxy_pool is not None:
+            self.metrics.set_gauge('healthy_proxies', self.proxy_pool.healthy_count())
+        if self.plugin_pipeline is not None:
+            self.metrics.set_gauge('plugin_queue', self.plugin_pipeline.pending())
+        self.write_metrics_file()
+        self.last_metrics_report = time.monotonic()
+
+    def write_metrics_file(self):
+        metrics_file = self.config.get('metrics_file')
+        if not metrics_file:
+            return
+        temp_file = metrics_file + '.tmp'
+        with open(temp_file, 'w') as f:
+            json.dump(self.metrics.snapshot(), f, indent=2)
+        os.replace(temp_file, metrics_file)
+
+    def setup_metrics_server(self):
+        port = self.config.get('metrics_port')
+        if port is None:
+            return None
+        server = MetricsServer((self.config.get('metrics_host', '127.0.0.1'), port), self.metrics)
+        threading.Thread(target=server.serve_forever, name='metrics-server', daemon=True).start()
+        return server
+
+    def report_metrics(self):
+        self.metrics.set_gauge('frontier_size', len(self.frontier))
+        self.metrics.set_gauge('scheduler_size', 0)
+        self.metrics.set_gauge('in_flight', 0)
+        self.write_metrics_file()
+        # The summary covers this pass only, not the time spent waiting for it to be scheduled
+        snapshot = self.metrics.pass_snapshot()
+        self.logger.info(f"Crawled {snapshot['pages']} pages ({snapshot['not_modified']} not modified) in "
+                         f"{snapshot['elapsed_seconds']:.1f}s ({snapshot['pages_per_second']:.2f} pages/s, "
+                         f"{snapshot['bytes_per_second'] / 1024:.1f} KiB/s)")
+        for stage, histogram in sorted(snapshot['stages'].items()):
+            self.logger.info(f"  {stage}: {histogram['sum']:.2f}s over {histogram['count']} calls")
+
+    def save_state(self, pending=()):
+        # Pages must be durable before the snapshot records them as crawled. Workers may still be writing,
+        # and handlers that rotate files or write row groups can't flush halfway through a write.
+        with self.output_lock:
+            self.output_handler.flush()
+        self.save_seen_store()
         state = {
-            'visited': self.visited,
-            'to_visit': self.to_visit,
-            'content_store': self.content_store
+            # The seen store itself lives in the seen file; the snapshot covers its first seen_saved fingerprints
+            'seen': self.seen_saved,
+            'to_visit': self.frontier.snapshot(),
+            'pending': list(pending),
+            # URLs finished before a resumed crash may still sit in the frontier snapshot
+            'done': list(self.recovered_done),
         }
-        with open('crawler_state.pkl', 'wb') as f:
+        # Write to a temporary file and rename it so a crash never leaves a torn snapshot
+        temp_file = self.state_file + '.tmp'
+        with open(temp_file, 'wb') as f:
             pickle.dump(state, f)
+            f.flush()
+            os.fsync(f.fileno())
+        os.replace(temp_file, self.state_file)
+        self.frontier.commit()
+
+        # Everything logged so far is covered by the snapshot
+        if self.wal is not None:
+            self.wal.truncate(0)
+        elif os.path.exists(self.state_file + '.wal'):
+            os.remove(self.state_file + '.wal')
+        self.last_checkpoint = time.monotonic()
+
+    def save_seen_store(self):
+        # Append only what was added since the last checkpoint, rather than rewriting the whole store
+        fingerprints = array.array('Q', self.visited.take_unsaved())
+        with open(self.state_file + '.seen', 'wb' if self.seen_saved is None else 'ab') as f:
+            fingerprints.tofile(f)
+            f.flush()
+            os.fsync(f.fileno())
+        self.seen_saved = (self.seen_saved or 0) + len(fingerprints)
+
+    def load_seen_store(self, count):
+        fingerprints = array.array('Q')
+        with open(self.state_file + '.seen', 'r+b') as f:
+            fingerprints.fromfile(f, count)
+            # Fingerprints appended after the snapshot was taken come back when the log is replayed
+            f.truncate(count * fingerprints.itemsize)
+        store = self.setup_seen_store()
+        for fingerprint in fingerprints:
+            store.add_fingerprint(fingerprint)
+        store.take_unsaved()
+        self.seen_saved = count
+        return store
 
     def load_state(self):
-        if os.path.exists('crawler_state.pkl'):
-            with open('crawler_state.pkl', 'rb') as f:
+        if os.path.exists(self.state_file):
+            with open(self.state_file, 'rb') as f:
                 state = pickle.load(f)
-            self.visited = state['visited']
-            self.to_visit = state['to_visit']
-            self.content_store = state['content_store']
+            if 'seen' in state:
+                self.visited = self.load_seen_store(state['seen'])
+            else:
+                # State saved before the seen store was checkpointed separately, as a set of URLs
+                self.visited = self.setup_seen_store(state['visited'])
+            self.frontier.restore(state['to_visit'])
+            for url, depth in state.get('pending', []):
+                self.frontier.push(url, depth)
+            self.recovered_done = set(state.get('done', []))
+            self.replay_wal()
             return True
         return False
 
+    def replay_wal(self):
+        wal_file = self.state_file + '.wal'
+        if not os.path.exists(wal_file):
+            return
+        with open(wal_file, 'r') as f:
+            for line in f:
+                try:
+                    record = json.loads(line)
+                except ValueError:
+                    break  # Torn write from a crash; everything before it is intact
+                if record[0] == 'enqueue':
+                    if self.visited.add(record[1]):
+                        self.frontier.push(record[1], record[2])
+                elif record[0] == 'done':
+                    self.recovered_done.add(record[1])
+
     def report_broken_links(self):
         if self.broken_links:
             self.logger.info("Broken links found:")
@@ -271,15 +1009,1441 @@ class AdvancedWebCrawler:
                         plugins.append(module.CrawlerPlugin())
         return plugins
 
+class PageAnalysis:
+    def __init__(self, title, links, metadata, text):
+        self.title = title
+        self.links = links
+        self.metadata = metadata
+        self.text = text
+
+def default_html_parser():
+    return 'lxml' if importlib.util.find_spec('lxml') else 'html.parser'
+
+def analyze_html(base_url, content, parser='html.parser'):
+    soup = BeautifulSoup(content, parser)
+    title = soup.title.get_text() if soup.title else 'No title'
+
+    links = []
+    for link in soup.find_all('a'):
+        href = link.get('href')
+        if href and not href.startswith(('mailto:', 'tel:', 'javascript:')):
+            links.append(urllib.parse.urljoin(base_url, href))
+
+    metadata = {}
+    for meta in soup.find_all('meta'):
+        key = meta.get('name') or meta.get('property')
+        if key:
+            metadata[key] = meta.get('content')
+
+    for element in soup(['script', 'style', 'noscript', 'template']):
+        element.decompose()
+    text = ' '.join(soup.stripped_strings)
+
+    return PageAnalysis(title, links, metadata, text)
+
+def ensure_nltk_data():
+    # Only touch the network when a resource is actually missing
+    for resource, package in (('tokenizers/punkt', 'punkt'), ('corpora/crubadan', 'crubadan')):
+        try:
+            nltk.data.find(resource)
+        except LookupError:
+            nltk.download(package, quiet=True)
+
+class LanguageProfiles:
+    # TextCat's out-of-place measure, with every language's trigram ranks indexed once up front.
+    # TextCat re-derives the ranks on each call, which dominates classification time.
+    def __init__(self, textcat, corpus):
+        self.textcat = textcat
+        self.languages = list(corpus.langs())
+        self.postings = {}
+        for language_index, language in enumerate(self.languages):
+            for rank, trigram in enumerate(corpus.lang_freq(language)):
+                postings = self.postings.get(trigram)
+                if postings is None:
+                    postings = self.postings[trigram] = (array.array('H'), array.array('I'))
+                postings[0].append(language_index)
+                postings[1].append(rank)
+
+    def classify(self, text):
+        profile = self.textcat.profile(text)
+        hits = [0] * len(self.languages)
+        distances = [0] * len(self.languages)
+        for position, trigram in enumerate(profile):
+            postings = self.postings.get(trigram)
+            if postings is None:
+                continue
+            for language_index, rank in zip(*postings):
+                hits[language_index] += 1
+                distances[language_index] += abs(rank - position)
+        # TextCat charges sys.maxsize per missing trigram, so fewer misses always wins and rank distance breaks ties
+        missing = len(profile)
+        best = min(range(len(self.languages)), key=lambda index: (missing - hits[index], distances[index]))
+        return self.languages[best]
+
+_language_profiles = None
+_language_profiles_lock = threading.Lock()
+
+def load_language_profiles():
+    global _language_profiles
+    with _language_profiles_lock:
+        if _language_profiles is None:
+            ensure_nltk_data()
+            _language_profiles = LanguageProfiles(TextCat(), nltk.corpus.crubadan)
+        return _language_profiles
+
+class TextClassifier:
+    def __init__(self, profiles, sample_chars=2000, cache_size=10000):
+        self.profiles = profiles
+        self.sample_chars = sample_chars
+        self.cache_size = cache_size
+        self.cache = collections.OrderedDict()
+        self.lock = threading.Lock()
+
+    def sample(self, text):
+        # A window from the middle of the page says as much about its language as the whole text,
+        # and skips navigation and footer boilerplate
+        if not self.sample_chars or len(text) <= self.sample_chars:
+            return text
+        start = (len(text) - self.sample_chars) // 2
+        sample = text[start:start + self.sample_chars]
+        # Trim to word boundaries so cut-off words don't add stray trigrams
+        first, last = sample.find(' '), sample.rfind(' ')
+        if 0 <= first < last:
+            sample = sample[first + 1:last]
+        return sample
+
+    def classify(self, text):
+        sample = self.sample(text)
+        # Pages sharing a template or error page are only classified once
+        key = hashlib.blake2b(sample.encode('utf-8', 'replace'), digest_size=8).digest()
+        with self.lock:
+            if key in self.cache:
+                self.cache.move_to_end(key)
+                return self.cache[key]
+        category = self.classify_uncached(sample)
+        with self.lock:
+            self.cache[key] = category
+            while len(self.cache) > self.cache_size:
+                self.cache.popitem(last=False)
+        return category
+
+    def classify_uncached(self, sample):
+        return self.profiles.classify(sample)
+
+_worker_classifier = None
+
+def init_parse_worker(sample_chars=2000, cache_size=10000):
+    global _worker_classifier
+    _worker_classifier = TextClassifier(load_language_profiles(), sample_chars, cache_size)
+
+def analyze_and_categorize(base_url, content, parser):
+    # Stage timings are measured here since the parent process only sees the round trip
+    started, cpu_started = time.perf_counter(), time.thread_time()
+    page = analyze_html(base_url, content, parser)
+    parsed, cpu_parsed = time.perf_counter(), time.thread_time()
+    category = _worker_classifier.classify(page.text)
+    timings = ((parsed - started, cpu_parsed - cpu_started), (time.perf_counter() - parsed, time.thread_time() - cpu_parsed))
+    return page, category, timings
+
+def simhash(text):
+    # Tokens containing digits (dates, times, counters) are dropped so routine churn does not move the signature
+    weights = collections.Counter(token for token in re.findall(r'\w+', text.lower()) if not any(c.isdigit() for c in token))
+    vector = [0] * 64
+    for token, weight in weights.items():
+        token_hash = int.from_bytes(hashlib.blake2b(token.encode(), digest_size=8).digest(), 'big')
+        for bit in range(64):
+            vector[bit] += weight if token_hash >> bit & 1 else -weight
+    return sum(1 << bit for bit in range(64) if vector[bit] > 0)
+
+def content_signature(content, text):
+    content_hash = hashlib.blake2b(content.encode('utf-8', 'replace'), digest_size=8).digest()
+    return content_hash, simhash(text)
+
+class ChangeIndex:
+    def __init__(self, filename, threshold=3, revisit_interval=86400, min_revisit_interval=3600,
+                 max_revisit_interval=30 * 86400):
+        self.threshold = threshold
+        self.revisit_interval = revisit_interval
+        self.min_revisit_interval = min_revisit_interval
+        self.max_revisit_interval = max_revisit_interval
+        self.lock = threading.Lock()
+        self.conn = sqlite3.connect(filename, check_same_thread=False)
+        self.conn.execute('PRAGMA journal_mode=WAL')
+        self.conn.execute('PRAGMA synchronous=NORMAL')
+        # The 64-bit SimHash is also split into four 16-bit bands; pages within `threshold` <= 3 bits share a band
+        self.conn.execute('''CREATE TABLE IF NOT EXISTS signatures
+                             (url TEXT PRIMARY KEY, content_hash BLOB, simhash INTEGER,
+                              band0 INTEGER, band1 INTEGER, band2 INTEGER, band3 INTEGER, written INTEGER DEFAULT 0)''')
+        columns = [row[1] for row in self.conn.execute('PRAGMA table_info(signatures)')]
+        if 'written' not in columns:
+            # Indexes created before near-duplicate skipping tracked which pages reached the output
+            self.conn.execute('ALTER TABLE signatures ADD COLUMN written INTEGER DEFAULT 0')
+        for band in range(4):
+            self.conn.execute(f'CREATE INDEX IF NOT EXISTS signatures_band{band} ON signatures (band{band})')
+        self.conn.execute('''CREATE TABLE IF NOT EXISTS revisits
+                             (url TEXT PRIMARY KEY, etag TEXT, last_modified TEXT, links TEXT, interval REAL, next_visit REAL)''')
+        self.conn.commit()
+
+    @staticmethod
+    def bands(text_hash):
+        return [text_hash >> (16 * band) & 0xFFFF for band in range(4)]
+
+    @staticmethod
+    def to_signed(value):
+        # SQLite integers are signed 64-bit
+        return value - (1 << 64) if value >= 1 << 63 else value
+
+    def record(self, url, content_hash, text_hash):
+        with self.lock:
+            row = self.conn.execute('SELECT content_hash, simhash FROM signatures WHERE url = ?', (url,)).fetchone()
+            if row is None:
+                self.conn.execute('INSERT INTO signatures (url, content_hash, simhash, band0, band1, band2, band3) '
+                                  'VALUES (?, ?, ?, ?, ?, ?, ?)',
+                                  (url, content_hash, self.to_signed(text_hash), *self.bands(text_hash)))
+                changed = False
+            elif row[0] == content_hash:
+                return False
+            else:
+                changed = bin((row[1] % (1 << 64)) ^ text_hash).count('1') > self.threshold
+                if changed:
+                    self.conn.execute('UPDATE signatures SET content_hash = ?, simhash = ?, band0 = ?, band1 = ?, band2 = ?, '
+                                      'band3 = ? WHERE url = ?',
+                                      (content_hash, self.to_signed(text_hash), *self.bands(text_hash), url))
+                else:
+                    # Keep the last notified SimHash so small edits accumulate until they cross the threshold
+                    self.conn.execute('UPDATE signatures SET content_hash = ? WHERE url = ?', (content_hash, url))
+            self.conn.commit()
+            return changed
+
+    def get_revisit(self, url):
+        with self.lock:
+            row = self.conn.execute('SELECT etag, last_modified, links, interval, next_visit FROM revisits WHERE url = ?',
+                                    (url,)).fetchone()
+        if row is None:
+            return None
+        return {'etag': row[0], 'last_modified': row[1], 'links': json.loads(row[2]), 'interval': row[3],
+                'next_visit': row[4]}
+
+    def record_revisit(self, url, etag, last_modified, links, changed):
+        with self.lock:
+            row = self.conn.execute('SELECT interval FROM revisits WHERE url = ?', (url,)).fetchone()
+            interval = self.revisit_interval if row is None else self.adapt_interval(row[0], changed)
+            self.conn.execute('INSERT OR REPLACE INTO revisits VALUES (?, ?, ?, ?, ?, ?)',
+                              (url, etag, last_modified, json.dumps(links), interval, time.time() + interval))
+            self.conn.commit()
+
+    def record_not_modified(self, url):
+        with self.lock:
+            row = self.conn.execute('SELECT interval FROM revisits WHERE url = ?', (url,)).fetchone()
+            interval = self.adapt_interval(row[0], False)
+            self.conn.execute('UPDATE revisits SET interval = ?, next_visit = ? WHERE url = ?',
+                              (interval, time.time() + interval, url))
+            self.conn.commit()
+
+    def adapt_interval(self, interval, changed):
+        # Pages that change get revisited twice as often; stable pages back off
+        interval = interval / 2 if changed else interval * 2
+        return min(max(interval, self.min_revisit_interval), self.max_revisit_interval)
+
+    def mark_written(self, url):
+        with self.lock:
+            self.conn.execute('UPDATE signatures SET written = 1 WHERE url = ?', (url,))
+            self.conn.commit()
+
+    def find_near_duplicate(self, url, text_hash):
+        # Only pages that reached the output count, so a skipped duplicate never hides the page it duplicates
+        bands = self.bands(text_hash)
+        with self.lock:
+            rows = self.conn.execute('SELECT url, simhash FROM signatures WHERE (band0 = ? OR band1 = ? OR band2 = ? '
+                                     'OR band3 = ?) AND url != ? AND written', (*bands, url)).fetchall()
+        for other_url, other_hash in rows:
+            if bin((other_hash % (1 << 64)) ^ text_hash).count('1') <= self.threshold:
+                return other_url
+        return None
+
+class RobotsCache:
+    def __init__(self, session, logger, ttl=86400, error_ttl=300, max_size=10000, timeout=5):
+        self.session = session
+        self.logger = logger
+        self.ttl = ttl
+        self.error_ttl = error_ttl
+        self.max_size = max_size
+        self.timeout = timeout
+        self.parsers = collections.OrderedDict()  # origin -> (parser, expires at)
+        self.pending = {}  # origin -> event set once its robots.txt fetch finishes
+        self.lock = threading.Lock()
+
+    def can_fetch(self, useragent, url):
+        return self.get(url).can_fetch(useragent, url)
+
+    def crawl_delay(self, useragent, url):
+        # Only consult robots.txt that is already cached so scheduling never waits on a fetch
+        parser = self.peek(url)
+        return parser.crawl_delay(useragent) if parser else None
+
+    def peek(self, url):
+        with self.lock:
+            entry = self.parsers.get(self.origin(url))
+            if entry is not None and entry[1] > time.monotonic():
+                return entry[0]
+        return None
+
+    def get(self, url):
+        origin = self.origin(url)
+        while True:
+            with self.lock:
+                entry = self.parsers.get(origin)
+                if entry is not None and entry[1] > time.monotonic():
+                    self.parsers.move_to_end(origin)
+                    return entry[0]
+                event = self.pending.get(origin)
+                if event is None:
+                    event = self.pending[origin] = threading.Event()
+                    break
+            # Another worker is already fetching this host's robots.txt
+            event.wait()
+
+        try:
+            parser, ttl = self.fetch(origin)
+            with self.lock:
+                self.parsers[origin] = (parser, time.monotonic() + ttl)
+                self.parsers.move_to_end(origin)
+                while len(self.parsers) > self.max_size:
+                    self.parsers.popitem(last=False)
+        finally:
+            with self.lock:
+                del self.pending[origin]
+            event.set()
+        return parser
+
+    def fetch(self, origin):
+        parser = RobotFileParser()
+        parser.set_url(origin + "/robots.txt")
+        try:
+            response = self.session.get(parser.url, timeout=self.timeout)
+        except requests.exceptions.RequestException as e:
+            # An unread parser disallows everything; retry sooner than a successful fetch
+            self.logger.error(f"Error reading robots.txt for {origin}: {e}")
+            return parser, min(self.ttl, self.error_ttl)
+
+        if response.status_code in (401, 403):
+            parser.disallow_all = True
+        elif 400 <= response.status_code < 500:
+            parser.allow_all = True
+        elif response.status_code >= 500:
+            self.logger.error(f"Error reading robots.txt for {origin}: HTTP {response.status_code}")
+            return parser, min(self.ttl, self.error_ttl)
+        else:
+            parser.parse(response.text.splitlines())
+        return parser, self.ttl
+
+    @staticmethod
+    def origin(url):
+        parts = urllib.parse.urlsplit(url)
+        return f"{parts.scheme}://{parts.netloc}"
+
+LATENCY_BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1, 2.5, 5, 10)
+
+class Histogram:
+    def __init__(self, buckets=LATENCY_BUCKETS):
+        self.buckets = buckets
+        self.counts = [0] * (len(buckets) + 1)
+        self.count = 0
+        self.sum = 0.0
+
+    def observe(self, value):
+        self.counts[bisect.bisect_left(self.buckets, value)] += 1
+        self.count += 1
+        self.sum += value
+
+    def cumulative(self):
+        # Prometheus-style buckets: observations <= each bound, ending with +Inf
+        total = 0
+        result = []
+        for bound, count in zip(self.buckets + (math.inf,), self.counts):
+            total += count
+            result.append((bound, total))
+        return result
+
+    def to_dict(self):
+        return {
+            'count': self.count,
+            'sum': self.sum,
+            'buckets': {('+Inf' if bound == math.inf else str(bound)): count for bound, count in self.cumulative()},
+        }
+
+class CrawlMetrics:
+    def __init__(self, max_hosts=1000):
+        # Hosts past max_hosts share one 'other' series so a broad crawl can't grow the metrics without bound
+        self.max_hosts = max_hosts
+        self.lock = threading.Lock()
+        self.started = time.monotonic()
+        self.counters = collections.Counter()
+        self.stages = collections.defaultdict(Histogram)
+        self.stage_cpu = collections.Counter()
+        self.host_latency = {}
+        self.gauges = {}
+        # Exported counters only ever grow; each crawl pass is summarised against where they stood when it started
+        self.pass_started = self.started
+        self.pass_counters = collections.Counter()
+        self.pass_stages = {}
+
+    def start_pass(self):
+        with self.lock:
+            self.pass_started = time.monotonic()
+            self.pass_counters = self.counters.copy()
+            self.pass_stages = {stage: (histogram.count, histogram.sum) for stage, histogram in self.stages.items()}
+
+    def increment(self, name, value=1):
+        with self.lock:
+            self.counters[name] += value
+
+    def set_gauge(self, name, value):
+        with self.lock:
+            self.gauges[name] = value
+
+    def observe_stage(self, stage, seconds, cpu_seconds=None):
+        with self.lock:
+            self.stages[stage].observe(seconds)
+            if cpu_seconds is not None:
+                self.stage_cpu[stage] += cpu_seconds
+
+    def add_stage_cpu(self, stage, cpu_seconds):
+        with self.lock:
+            self.stage_cpu[stage] += cpu_seconds
+
+    @contextlib.contextmanager
+    def time_stage(self, stage):
+        # Thread CPU time separates CPU-bound stages from ones that mostly wait on locks or I/O
+        started, cpu_started = time.perf_counter(), time.thread_time()
+        try:
+            yield
+        finally:
+            self.observe_stage(stage, time.perf_counter() - started, time.thread_time() - cpu_started)
+
+    def observe_fetch(self, url, seconds, size, cpu_seconds=None):
+        host = urllib.parse.urlsplit(url).netloc
+        with self.lock:
+            self.stages['fetch'].observe(seconds)
+            if cpu_seconds is not None:
+                self.stage_cpu['fetch'] += cpu_seconds
+            self.counters['bytes'] += size
+            if host not in self.host_latency and len(self.host_latency) >= self.max_hosts:
+                host = 'other'
+            self.host_latency.setdefault(host, Histogram()).observe(seconds)
+
+    def snapshot(self):
+        with self.lock:
+            elapsed = time.monotonic() - self.started
+            return {
+                'elapsed_seconds': elapsed,
+                'pages': self.counters['pages'],
+                'bytes': self.counters['bytes'],
+                'not_modified': self.counters['not_modified'],
+                'fetch_errors': self.counters['fetch_errors'],
+                'proxy_errors': self.counters['proxy_errors'],
+                'pages_per_second': self.counters['pages'] / elapsed if elapsed else 0.0,
+                'bytes_per_second': self.counters['bytes'] / elapsed if elapsed else 0.0,
+                'gauges': dict(self.gauges),
+                'stages': {stage: histogram.to_dict() for stage, histogram in self.stages.items()},
+                'stage_cpu_seconds': dict(self.stage_cpu),
+                'host_latency': {host: histogram.to_dict() for host, histogram in self.host_latency.items()},
+            }
+
+    def pass_snapshot(self):
+        with self.lock:
+            elapsed = time.monotonic() - self.pass_started
+            counters = self.counters - self.pass_counters
+            stages = {}
+            for stage, histogram in self.stages.items():
+                count, total = self.pass_stages.get(stage, (0, 0.0))
+                stages[stage] = {'count': histogram.count - count, 'sum': histogram.sum - total}
+            return {
+                'elapsed_seconds': elapsed,
+                'pages': counters['pages'],
+                'bytes': counters['bytes'],
+                'not_modified': counters['not_modified'],
+                'pages_per_second': counters['pages'] / elapsed if elapsed else 0.0,
+                'bytes_per_second': counters['bytes'] / elapsed if elapsed else 0.0,
+                'stages': stages,
+            }
+
+    def render_prometheus(self):
+        lines = []
+        with self.lock:
+            for name in ('pages', 'bytes', 'not_modified', 'fetch_errors', 'proxy_errors'):
+                lines.append(f'# TYPE crawler_{name}_total counter')
+                lines.append(f'crawler_{name}_total {self.counters[name]}')
+            for name, value in sorted(self.gauges.items()):
+                lines.append(f'# TYPE crawler_{name} gauge')
+                lines.append(f'crawler_{name} {value}')
+            lines.append('# TYPE crawler_stage_cpu_seconds_total counter')
+            for stage, seconds in sorted(self.stage_cpu.items()):
+                lines.append(f'crawler_stage_cpu_seconds_total{{stage="{stage}"}} {seconds}')
+            lines.append('# TYPE crawler_stage_seconds histogram')
+            for stage, histogram in sorted(self.stages.items()):
+                lines.extend(self.histogram_lines('crawler_stage_seconds', f'stage="{stage}"', histogram))
+            lines.append('# TYPE crawler_fetch_seconds histogram')
+            for host, histogram in sorted(self.host_latency.items()):
+                host = host.replace('\\', '\\\\').replace('"', '\\"')
+                lines.extend(self.histogram_lines('crawler_fetch_seconds', f'host="{host}"', histogram))
+        return '\n'.join(lines) + '\n'
+
+    @staticmethod
+    def histogram_lines(name, labels, histogram):
+        for bound, count in histogram.cumulative():
+            le = '+Inf' if bound == math.inf else str(bound)
+            yield f'{name}_bucket{{{labels},le="{le}"}} {count}'
+        yield f'{name}_sum{{{labels}}} {histogram.sum}'
+        yield f'{name}_count{{{labels}}} {histogram.count}'
+
+class MetricsServer(http.server.ThreadingHTTPServer):
+    daemon_threads = True
+
+    def __init__(self, address, metrics):
+        self.metrics = metrics
+        super().__init__(address, MetricsRequestHandler)
+
+class MetricsRequestHandler(http.server.BaseHTTPRequestHandler):
+    def do_GET(self):
+        if self.path == '/metrics':
+            body, content_type = self.server.metrics.render_prometheus(), 'text/plain; version=0.0.4'
+        elif self.path == '/metrics.json':
+            body, content_type = json.dumps(self.server.metrics.snapshot()), 'application/json'
+        else:
+            self.send_error(404)
+            return
+        body = body.encode('utf-8')
+        self.send_response(200)
+        self.send_header('Content-Type', content_type)
+        self.send_header('Content-Length', str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+
+    def log_message(self, format, *args):
+        # Scrapes every few seconds would otherwise flood stderr
+        pass
+
+NOT_MODIFIED = object()
+
+# A fixed table rather than mimetypes, whose answers depend on the host's /etc/mime.types and would skip
+# pages served by scripts such as .pl or .php
+MEDIA_EXTENSIONS = {
+    '.pdf': 'application/pdf',
+    '.jpg': 'image/jpeg', '.jpeg': 'image/jpeg', '.png': 'image/png', '.gif': 'image/gif', '.webp': 'image/webp',
+    '.svg': 'image/svg+xml', '.ico': 'image/vnd.microsoft.icon', '.bmp': 'image/bmp', '.tif': 'image/tiff',
+    '.tiff': 'image/tiff',
+    '.mp3': 'audio/mpeg', '.wav': 'audio/wav', '.ogg': 'audio/ogg', '.flac': 'audio/flac', '.m4a': 'audio/mp4',
+    '.mp4': 'video/mp4', '.m4v': 'video/mp4', '.webm': 'video/webm', '.avi': 'video/x-msvideo',
+    '.mov': 'video/quicktime', '.mkv': 'video/x-matroska', '.wmv': 'video/x-ms-wmv', '.flv': 'video/x-flv',
+    '.zip': 'application/zip', '.gz': 'application/gzip', '.tgz': 'application/gzip', '.bz2': 'application/x-bzip2',
+    '.xz': 'application/x-xz', '.7z': 'application/x-7z-compressed', '.rar': 'application/vnd.rar',
+    '.tar': 'application/x-tar',
+    '.exe': 'application/octet-stream', '.dmg': 'application/octet-stream', '.iso': 'application/octet-stream',
+    '.msi': 'application/octet-stream', '.apk': 'application/vnd.android.package-archive',
+    '.woff': 'font/woff', '.woff2': 'font/woff2', '.ttf': 'font/ttf', '.otf': 'font/otf',
+}
+
+TUNNEL_STATUS = re.compile(r'Tunnel connection failed: (\d{3})')
+
+def is_proxy_failure(error):
+    # Only failing to reach or authenticate with the proxy counts against it. A proxy answering CONNECT with
+    # 502 or 504, a dropped connection or a read timeout usually means the target is down, not the proxy.
+    if isinstance(error, requests.exceptions.HTTPError):
+        return error.response is not None and error.response.status_code == 407
+    if isinstance(error, requests.exceptions.ProxyError):
+        tunnel = TUNNEL_STATUS.search(str(error))
+        return tunnel is None or tunnel.group(1) == '407'
+    if isinstance(error, requests.exceptions.ConnectTimeout):
+        return True
+    if aiohttp is not None:
+        if isinstance(error, aiohttp.ClientResponseError):
+            return error.status == 407
+        return isinstance(error, aiohttp.ClientProxyConnectionError)
+    return False
+
+class ProxyPool:
+    def __init__(self, proxies, session_factory=None, failure_threshold=3, base_backoff=30, max_backoff=600,
+                 error_penalty=5, alpha=0.2, rng=None):
+        self.proxies = list(proxies)
+        self.session_factory = session_factory or requests.Session
+        self.failure_threshold = failure_threshold
+        self.base_backoff = base_backoff
+        self.max_backoff = max_backoff
+        # A failure costs as much as a request taking error_penalty seconds when comparing proxies
+        self.error_penalty = error_penalty
+        self.alpha = alpha
+        self.rng = rng or random.Random()
+        self.latency = dict.fromkeys(self.proxies)  # moving average in seconds; None until a request succeeds
+        self.error_rate = dict.fromkeys(self.proxies, 0.0)
+        self.consecutive_failures = collections.Counter()
+        self.ejections = collections.Counter()
+        self.ejected_until = {}
+        self.sessions = {}
+        self.lock = threading.Lock()
+
+    def choose(self, exclude=()):
+        now = time.monotonic()
+        with self.lock:
+            candidates = [proxy for proxy in self.proxies if proxy not in exclude]
+            if not candidates:
+                return None
+            healthy = [proxy for proxy in candidates if self.ejected_until.get(proxy, 0) <= now]
+            if not healthy:
+                # Everything left is ejected; the proxy closest to coming back is the best bet
+                return min(candidates, key=lambda proxy: self.ejected_until[proxy])
+            if len(healthy) == 1:
+                return healthy[0]
+            # Best of two random picks favours fast proxies without piling all traffic onto one
+            return min(self.rng.sample(healthy, 2), key=self.cost)
+
+    def cost(self, proxy):
+        if self.latency[proxy] is None:
+            return 0.0  # untried proxies get a chance first
+        return self.latency[proxy] + self.error_penalty * self.error_rate[proxy]
+
+    def session(self, proxy):
+        with self.lock:
+            session = self.sessions.get(proxy)
+            if session is None:
+                # One session per proxy keeps its connections alive between requests
+                session = self.sessions[proxy] = self.session_factory()
+                session.proxies = {'http': proxy, 'https': proxy}
+            return session
+
+    def record_success(self, proxy, seconds):
+        with self.lock:
+            previous = self.latency[proxy]
+            self.latency[proxy] = seconds if previous is None else previous + self.alpha * (seconds - previous)
+            self.error_rate[proxy] *= 1 - self.alpha
+            self.consecutive_failures[proxy] = 0
+            self.ejections[proxy] = 0
+
+    def record_failure(self, proxy):
+        # Returns True when this failure ejects the proxy
+        with self.lock:
+            self.error_rate[proxy] += self.alpha * (1 - self.error_rate[proxy])
+            self.consecutive_failures[proxy] += 1
+            if self.consecutive_failures[proxy] < self.failure_threshold:
+                return False
+            backoff = min(self.max_backoff, self.base_backoff * 2 ** self.ejections[proxy])
+            self.ejected_until[proxy] = time.monotonic() + backoff
+            self.ejections[proxy] += 1
+            self.consecutive_failures[proxy] = 0
+            session = self.sessions.pop(proxy, None)
+        if session is not None:
+            # Drop pooled connections that may be what is broken
+            session.close()
+        return True
+
+    def healthy_count(self):
+        now = time.monotonic()
+        with self.lock:
+            return sum(1 for proxy in self.proxies if self.ejected_until.get(proxy, 0) <= now)
+
+class ResponseTooLarge(Exception):
+    pass
+
+META_CHARSET = re.compile(rb'<meta[^>]+charset=["\']?([\w-]+)', re.IGNORECASE)
+
+class BodyDecoder:
+    # Decodes a response body chunk by chunk and enforces a size cap on the bytes received
+    def __init__(self, content_type='', max_bytes=None, sniff_bytes=1024):
+        _, _, params = content_type.partition(';')
+        match = re.search(r'charset=["\']?([\w-]+)', params, re.IGNORECASE)
+        self.encoding = match.group(1) if match else None
+        self.max_bytes = max_bytes
+        self.sniff_bytes = sniff_bytes
+        self.size = 0
+        self.head = b''
+        self.decoder = None
+        self.parts = []
+
+    def feed(self, chunk):
+        self.size += len(chunk)
+        if self.max_bytes and self.size > self.max_bytes:
+            raise ResponseTooLarge(f"body exceeds max_body_size {self.max_bytes}")
+        if self.decoder is None:
+            # Without a charset header, hold the first bytes back until a <meta charset> would have been seen
+            self.head += chunk
+            if self.encoding is None and len(self.head) < self.sniff_bytes:
+                return
+            chunk, self.head = self.head, b''
+            self.start_decoder(chunk)
+        self.parts.append(self.decoder.decode(chunk))
+
+    def start_decoder(self, head):
+        encoding = self.encoding
+        if encoding is None:
+            match = META_CHARSET.search(head)
+            encoding = match.group(1).decode('ascii') if match else 'utf-8'
+        try:
+            codecs.lookup(encoding)
+        except LookupError:
+            encoding = 'utf-8'
+        self.decoder = codecs.getincrementaldecoder(encoding)(errors='replace')
+
+    def finish(self):
+        if self.decoder is None:
+            self.start_decoder(self.head)
+            self.parts.append(self.decoder.decode(self.head))
+        self.parts.append(self.decoder.decode(b'', final=True))
+        return ''.join(self.parts)
+
+JS_APP_ROOT = re.compile(r'<(?:div|main)[^>]*\bid=["\']?(?:root|app|__next|__nuxt)\b[^>]*>\s*</', re.IGNORECASE)
+NOSCRIPT_JS_WARNING = re.compile(r'<noscript[^>]*>(?:(?!</noscript).){0,500}?javascript', re.IGNORECASE | re.DOTALL)
+SCRIPT_OR_STYLE = re.compile(r'<(script|style)\b.*?</\1\s*>', re.IGNORECASE | re.DOTALL)
+TAG = re.compile(r'<[^>]+>')
+
+def looks_js_dependent(content, min_text=200):
+    # Cheap checks on the static HTML so only client-rendered pages pay for a browser
+    if not re.search(r'<script\b', content, re.IGNORECASE):
+        return False
+    if JS_APP_ROOT.search(content) or NOSCRIPT_JS_WARNING.search(content):
+        return True
+    text = TAG.sub(' ', SCRIPT_OR_STYLE.sub(' ', content))
+    return len(' '.join(text.split())) < min_text
+
+def headless_chrome():
+    options = Options()
+    options.add_argument('--headless')
+    return webdriver.Chrome(options=options)
+
+class BrowserPool:
+    def __init__(self, size=2, max_pages=100, page_timeout=30, idle_time=0.5, driver_factory=headless_chrome):
+        self.max_pages = max_pages
+        self.page_timeout = page_timeout
+        self.idle_time = idle_time
+        self.driver_factory = driver_factory
+        self.slots = threading.BoundedSemaphore(size)
+        # Browsers are started on first use and kept warm between pages as (driver, pages served)
+        self.idle = queue.LifoQueue()
+
+    def fetch(self, url):
+        with self.slots:
+            driver, pages = self.checkout()
+            try:
+                driver.get(url)
+                self.wait_until_settled(driver)
+                content, title = driver.page_source, driver.title
+            except WebDriverException:
+                # A crashed or wedged browser is replaced rather than handed to the next page
+                self.discard(driver)
+                raise
+            if pages + 1 >= self.max_pages:
+                # Recycle long-lived browsers before leaked memory piles up
+                self.discard(driver)
+            else:
+                self.idle.put((driver, pages + 1))
+        return content, title
+
+    def checkout(self):
+        try:
+            return self.idle.get_nowait()
+        except queue.Empty:
+            driver = self.driver_factory()
+            driver.set_page_load_timeout(self.page_timeout)
+            return driver, 0
+
+    def wait_until_settled(self, driver):
+        # Wait for DOM ready, then until no new resources have loaded for idle_time; give up at page_timeout
+        deadline = time.monotonic() + self.page_timeout
+        resources = None
+        quiet_since = time.monotonic()
+        while time.monotonic() < deadline:
+            state, count = driver.execute_script(
+                "return [document.readyState, performance.getEntriesByType('resource').length]")
+            now = time.monotonic()
+            if state != 'complete' or count != resources:
+                resources = count
+                quiet_since = now
+            elif now - quiet_since >= self.idle_time:
+                return
+            time.sleep(min(0.1, self.idle_time))
+
+    def discard(self, driver):
+        try:
+            driver.quit()
+        except WebDriverException:
+            pass
+
+    def close(self):
+        while True:
+            try:
+                driver, _ = self.idle.get_nowait()
+            except queue.Empty:
+                return
+            self.discard(driver)
+
+def is_async_plugin(plugin):
+    method = getattr(plugin, 'process_batch', None) or getattr(plugin, 'process_page', None)
+    return asyncio.iscoroutinefunction(method)
+
+def run_plugin(plugin, batch, loop=None, concurrency=10):
+    # Plugins may define process_batch(items), process_page(url, content, page, category) or
+    # process(url, content, metadata, category); the first two may be coroutines.
+    # Returns the exceptions raised, so one bad page doesn't lose the rest of the batch.
+    if hasattr(plugin, 'process_batch'):
+        try:
+            result = plugin.process_batch(batch)
+            if asyncio.iscoroutine(result):
+                run_coroutine(result, loop)
+        except Exception as e:
+            return [e]
+        return []
+    if hasattr(plugin, 'process_page') and asyncio.iscoroutinefunction(plugin.process_page):
+        async def process_all():
+            semaphore = asyncio.Semaphore(concurrency)
+
+            async def process(item):
+                async with semaphore:
+                    await plugin.process_page(*item)
+
+            return await asyncio.gather(*(process(item) for item in batch), return_exceptions=True)
+
+        return [result for result in run_coroutine(process_all(), loop) if isinstance(result, Exception)]
+    errors = []
+    for url, content, page, category in batch:
+        try:
+            if hasattr(plugin, 'process_page'):
+                plugin.process_page(url, content, page, category)
+            else:
+                plugin.process(url, content, page.metadata, category)
+        except Exception as e:
+            errors.append(e)
+    return errors
+
+def run_coroutine(coroutine, loop):
+    if loop is None:
+        return asyncio.run(coroutine)
+    return loop.run_until_complete(coroutine)
+
+class PluginRunner:
+    # Feeds one plugin from its own bounded queue on its own thread, so a slow plugin holds up neither
+    # the fetch workers nor the other plugins until its queue fills
+    def __init__(self, plugin, logger, metrics, queue_size=256, batch_size=50, flush_interval=1.0, concurrency=10):
+        self.plugin = plugin
+        self.logger = logger
+        self.metrics = metrics
+        self.name = type(plugin).__module__
+        # Plain per-page plugins gain nothing from waiting for a batch to fill
+        batched = hasattr(plugin, 'process_batch') or is_async_plugin(plugin)
+        self.batch_size = batch_size if batched else 1
+        self.flush_interval = flush_interval
+        self.concurrency = concurrency
+        self.queue = queue.Queue(maxsize=queue_size)
+        self.thread = threading.Thread(target=self.run, name=f'plugin-{self.name}', daemon=True)
+        self.thread.start()
+
+    def run(self):
+        loop = asyncio.new_event_loop() if is_async_plugin(self.plugin) else None
+        try:
+            stopping = False
+            while not stopping:
+                batch, stopping = self.next_batch()
+                if batch:
+                    self.process(batch, loop)
+                for _ in range(len(batch) + stopping):
+                    self.queue.task_done()
+        finally:
+            if loop is not None:
+                loop.close()
+
+    def next_batch(self):
+        # Returns (items, stopping); None in the queue asks the runner to stop after what came before it
+        item = self.queue.get()
+        batch = []
+        deadline = time.monotonic() + self.flush_interval
+        while item is not None:
+            batch.append(item)
+            if len(batch) >= self.batch_size:
+                return batch, False
+            try:
+                item = self.queue.get(timeout=max(0.0, deadline - time.monotonic()))
+            except queue.Empty:
+                return batch, False
+        return batch, True
+
+    def process(self, batch, loop):
+        with self.metrics.time_stage('plugin_run'):
+            errors = run_plugin(self.plugin, batch, loop, self.concurrency)
+        for error in errors:
+            self.logger.error(f"Plugin {self.name} failed: {error!r}")
+        if errors:
+            self.metrics.increment('plugin_errors', len(errors))
+
+class PluginPipeline:
+    def __init__(self, plugins, logger, metrics, queue_size=256, batch_size=50, flush_interval=1.0, concurrency=10):
+        self.runners = [PluginRunner(plugin, logger, metrics, queue_size, batch_size, flush_interval, concurrency)
+                        for plugin in plugins]
+
+    def submit(self, url, content, page, category):
+        # Blocks while a plugin's queue is full, which slows fetching down to what the plugins can keep up with
+        for runner in self.runners:
+            runner.queue.put((url, content, page, category))
+
+    def pending(self):
+        return sum(runner.queue.qsize() for runner in self.runners)
+
+    def flush(self):
+        for runner in self.runners:
+            runner.queue.join()
+
+    def close(self):
+        for runner in self.runners:
+            runner.queue.put(None)
+        for runner in self.runners:
+            runner.thread.join()
+
+class ChangeNotifier:
+    # Collects change notifications and mails them as digests over one reused SMTP connection, on a
+    # background thread so a slow mail server never holds up a fetch worker
+    def __init__(self, recipient, logger, digest_interval=300, digest_size=100, smtp_host='localhost', smtp_port=25,
+                 sender='crawler@example.com', max_pending=10000, timeout=30):
+        self.recipient = recipient
+        self.logger = logger
+        self.digest_interval = digest_interval
+        self.digest_size = digest_size
+        self.smtp_host = smtp_host
+        self.smtp_port = smtp_port
+        self.sender = sender
+        self.max_pending = max_pending
+        self.timeout = timeout
+        self.changes = []
+        self.dropped = 0
+        self.lock = threading.Lock()
+        self.smtp = None
+        self.smtp_lock = threading.Lock()
+        self.wakeup = threading.Event()
+        self.stopping = False
+        self.thread = None
+
+    def notify(self, url, title):
+        with self.lock:
+            if len(self.changes) < self.max_pending:
+                self.changes.append((url, title))
+            else:
+                self.dropped += 1
+            if self.thread is None:
+                self.thread = threading.Thread(target=self.run, name='change-notifier', daemon=True)
+                self.thread.start()
+            if len(self.changes) >= self.digest_size:
+                self.wakeup.set()
+
+    def run(self):
+        while not self.stopping:
+            self.wakeup.wait(self.digest_interval)
+            self.wakeup.clear()
+            self.send_digest()
+
+    def send_digest(self):
+        with self.lock:
+            changes, self.changes = self.changes, []
+            dropped, self.dropped = self.dropped, 0
+        if not changes:
+            return
+        subject = f"Content change detected: {changes[0][1]}" if len(changes) == 1 else \
+            f"Content changes detected on {len(changes) + dropped} pages"
+        lines = [f"The content at {url} has changed." if title is None else
+                 f"The content at {url} has changed ({title})." for url, title in changes]
+        if dropped:
+            lines.append(f"... and {dropped} more pages.")
+        try:
+            self.send(subject, '\n'.join(lines))
+        except (smtplib.SMTPException, OSError) as e:
+            self.logger.error(f"Error sending change digest: {e}")
+            # Keep the changes for the next digest rather than losing them
+            with self.lock:
+                self.changes[:0] = changes[:self.max_pending - len(self.changes)]
+                self.dropped += dropped + max(0, len(changes) - self.max_pending)
+
+    def send(self, subject, body):
+        msg = MIMEText(body)
+        msg['Subject'] = subject
+        msg['From'] = self.sender
+        msg['To'] = self.recipient
+        with self.smtp_lock:
+            for attempt in range(2):
+                try:
+                    if self.smtp is None:
+                        self.smtp = smtplib.SMTP(self.smtp_host, self.smtp_port, timeout=self.timeout)
+                    self.smtp.send_message(msg)
+                    return
+                except (smtplib.SMTPServerDisconnected, ConnectionError):
+                    # Servers drop idle connections; reconnect once before giving up
+                    self.smtp = None
+                    if attempt:
+                        raise
+
+    def close(self):
+        with self.lock:
+            thread, self.thread = self.thread, None
+        if thread is not None:
+            self.stopping = True
+            self.wakeup.set()
+            thread.join()
+            self.stopping = False
+        self.send_digest()
+        with self.smtp_lock:
+            if self.smtp is not None:
+                try:
+                    self.smtp.quit()
+                except (smtplib.SMTPException, OSError):
+                    pass
+                self.smtp = None
+
+def canonicalize_url(url):
+    parts = urllib.parse.urlsplit(url)
+    scheme = parts.scheme.lower()
+    netloc = parts.netloc.lower()
+    if (scheme == 'http' and netloc.endswith(':80')) or (scheme == 'https' and netloc.endswith(':443')):
+        netloc = netloc.rsplit(':', 1)[0]
+    query = '&'.join(sorted(param for param in parts.query.split('&') if param))
+    return urllib.parse.urlunsplit((scheme, netloc, parts.path or '/', query, ''))
+
+def url_fingerprint(url):
+    return int.from_bytes(hashlib.blake2b(canonicalize_url(url).encode(), digest_size=8).digest(), 'big')
+
+class URLSeenStore:
+    def __init__(self):
+        self.fingerprints = set()
+        self.unsaved = []  # fingerprints added since the last checkpoint
+
+    def __len__(self):
+        return len(self.fingerprints)
+
+    def __contains__(self, url):
+        return url_fingerprint(url) in self.fingerprints
+
+    def add(self, url):
+        return self.add_fingerprint(url_fingerprint(url))
+
+    def add_fingerprint(self, fingerprint):
+        if fingerprint in self.fingerprints:
+            return False
+        self.fingerprints.add(fingerprint)
+        self.unsaved.append(fingerprint)
+        return True
+
+    def take_unsaved(self):
+        unsaved, self.unsaved = self.unsaved, []
+        return unsaved
+
+class BloomFilter:
+    def __init__(self, capacity, error_rate):
+        self.capacity = capacity
+        self.error_rate = error_rate
+        self.num_bits = math.ceil(-capacity * math.log(error_rate) / math.log(2) ** 2)
+        self.num_hashes = max(1, round(self.num_bits / capacity * math.log(2)))
+        self.bits = bytearray((self.num_bits + 7) // 8)
+        self.count = 0
+
+    def positions(self, fingerprint):
+        # Double hashing: derive every probe from the two halves of the 64-bit fingerprint
+        h1 = fingerprint & 0xFFFFFFFF
+        h2 = (fingerprint >> 32) | 1
+        return [(h1 + i * h2) % self.num_bits for i in range(self.num_hashes)]
+
+    def __contains__(self, fingerprint):
+        return all(self.bits[pos >> 3] & (1 << (pos & 7)) for pos in self.positions(fingerprint))
+
+    def add(self, fingerprint):
+        for pos in self.positions(fingerprint):
+            self.bits[pos >> 3] |= 1 << (pos & 7)
+        self.count += 1
+
+class BloomURLSeenStore:
+    def __init__(self, capacity=1000000, error_rate=0.001, growth=2, tightening=0.5):
+        self.growth = growth
+        self.tightening = tightening
+        # Each added filter gets a tighter error rate so the overall rate stays below error_rate
+        self.filters = [BloomFilter(capacity, error_rate * (1 - tightening))]
+        self.unsaved = []  # fingerprints added since the last checkpoint
+
+    def __len__(self):
+        return sum(bloom.count for bloom in self.filters)
+
+    def __contains__(self, url):
+        fingerprint = url_fingerprint(url)
+        return any(fingerprint in bloom for bloom in self.filters)
+
+    def add(self, url):
+        return self.add_fingerprint(url_fingerprint(url))
+
+    def add_fingerprint(self, fingerprint):
+        if any(fingerprint in bloom for bloom in self.filters):
+            return False
+        current = self.filters[-1]
+        if current.count >= current.capacity:
+            current = BloomFilter(current.capacity * self.growth, current.error_rate * self.tightening)
+            self.filters.append(current)
+        current.add(fingerprint)
+        self.unsaved.append(fingerprint)
+        return True
+
+    def take_unsaved(self):
+        unsaved, self.unsaved = self.unsaved, []
+        return unsaved
+
+class URLScorer:
+    # Higher scores are crawled first. Plugins can adjust the score with score_url(url, depth, score).
+    def __init__(self, crawler):
+        self.crawler = crawler
+        config = crawler.config
+        self.depth_weight = config.get('priority_depth_weight', 1.0)
+        self.inlink_weight = config.get('priority_inlink_weight', 1.0)
+        self.host_weight = config.get('priority_host_weight', 0.01)
+        self.freshness_weight = config.get('priority_freshness_weight', 2.0)
+        self.patterns = [(re.compile(pattern), weight) for pattern, weight in config.get('priority_patterns', {}).items()]
+
+    def score(self, url, depth, inlinks=0):
+        score = self.inlink_weight * math.log1p(inlinks) - self.depth_weight * depth
+        for pattern, weight in self.patterns:
+            if pattern.search(url):
+                score += weight
+        # Spread the budget: every page already taken from a host makes its other pages a little less urgent
+        score -= self.host_weight * self.crawler.host_pages[urllib.parse.urlsplit(url).netloc]
+        if self.freshness_weight:
+            revisit = self.crawler.change_index.get_revisit(url)
+            if revisit is not None and revisit['next_visit'] > time.time():
+                score -= self.freshness_weight
+        for plugin in self.crawler.plugins:
+            if hasattr(plugin, 'score_url'):
+                score = plugin.score_url(url, depth, score)
+        return score
+
+class PriorityFrontier:
+    def __init__(self, score):
+        self.score = score
+        self.heap = []  # (-score, sequence, url); entries are superseded, not removed, when a URL is rescored
+        self.queued = {}  # url -> (score, depth) of the live entry
+        self.inlinks = collections.Counter()
+        self.sequence = itertools.count()
+        # Links are noted from worker threads while the crawl loop pushes and pops
+        self.lock = threading.Lock()
+
+    def __len__(self):
+        return len(self.queued)
+
+    def push(self, url, depth):
+        with self.lock:
+            self.add(url, depth)
+
+    def add(self, url, depth):
+        score = self.score(url, depth, self.inlinks[url_fingerprint(url)])
+        self.queued[url] = (score, depth)
+        heapq.heappush(self.heap, (-score, next(self.sequence), url))
+
+    def score_link(self, url, depth):
+        with self.lock:
+            return self.score(url, depth, self.inlinks[url_fingerprint(url)] + 1)
+
+    def note_links(self, links):
+        with self.lock:
+            for link in links:
+                self.inlinks[url_fingerprint(link)] += 1
+                entry = self.queued.get(link)
+                if entry is not None:
+                    self.add(link, entry[1])
+
+    def pop(self, lifo=False):
+        with self.lock:
+            while self.heap:
+                negative_score, _, url = heapq.heappop(self.heap)
+                entry = self.queued.get(url)
+                if entry is not None and entry[0] == -negative_score:
+                    del self.queued[url]
+                    return url, entry[1]
+            return None
+
+    def ack(self, url):
+        pass
+
+    def snapshot(self):
+        with self.lock:
+            return [(url, depth) for url, (_, depth) in sorted(self.queued.items(), key=lambda item: -item[1][0])]
+
+    def restore(self, entries):
+        with self.lock:
+            self.heap = []
+            self.queued = {}
+            for url, depth in entries:
+                self.add(url, depth)
+
+    def commit(self):
+        pass
+
+class MemoryFrontier:
+    def __init__(self, entries=()):
+        self.entries = collections.deque(entries)
+
+    def __len__(self):
+        return len(self.entries)
+
+    def push(self, url, depth):
+        self.entries.append((url, depth))
+
+    def pop(self, lifo=False):
+        if not self.entries:
+            return None
+        return self.entries.pop() if lifo else self.entries.popleft()
+
+    def ack(self, url):
+        pass
+
+    def snapshot(self):
+        return list(self.entries)
+
+    def restore(self, entries):
+        self.entries = collections.deque(entries)
+
+    def commit(self):
+        pass
+
+class DiskFrontier:
+    def __init__(self, directory, segment_size=10000):
+        # Entries are ordered head -> spilled segments (oldest first) -> tail; only head and tail live in memory
+        self.directory = directory
+        self.segment_size = segment_size
+        self.head = collections.deque()
+        self.segments = collections.deque()  # (path, number of entries) of each spilled segment, oldest first
+        self.tail = collections.deque()
+        self.count = 0
+        self.consumed = []
+        os.makedirs(directory, exist_ok=True)
+        existing = [int(name.split('.')[0]) for name in os.listdir(directory) if name.endswith('.seg')]
+        self.next_segment = max(existing, default=-1) + 1
+
+    def __len__(self):
+        return self.count
+
+    def push(self, url, depth):
+        self.tail.append((url, depth))
+        self.count += 1
+        if len(self.tail) >= self.segment_size:
+            self.spill()
+
+    def pop(self, lifo=False):
+        if not self.count:
+            return None
+        self.count -= 1
+        if lifo:
+            if not self.tail and self.segments:
+                self.tail = self.load(self.segments.pop()[0])
+            return self.tail.pop() if self.tail else self.head.pop()
+        if not self.head and self.segments:
+            self.head = self.load(self.segments.popleft()[0])
+        return self.head.popleft() if self.head else self.tail.popleft()
+
+    def ack(self, url):
+        pass
+
+    def spill(self):
+        path = os.path.join(self.directory, f"{self.next_segment:012d}.seg")
+        self.next_segment += 1
+        with open(path, 'wb') as f:
+            pickle.dump(list(self.tail), f)
+        self.segments.append((path, len(self.tail)))
+        self.tail = collections.deque()
+
+    def load(self, path):
+        with open(path, 'rb') as f:
+            entries = collections.deque(pickle.load(f))
+        # The last checkpoint may still reference this segment, so only delete it on the next commit
+        self.consumed.append(path)
+        return entries
+
+    def snapshot(self):
+        # Spilled segments stay on disk, so only the in-memory ends and the segment paths and sizes need saving
+        return {'head': list(self.head), 'segments': list(self.segments), 'tail': list(self.tail)}
+
+    def restore(self, state):
+        self.head, self.segments, self.tail = collections.deque(), collections.deque(), collections.deque()
+        self.count = 0
+        self.consumed = []
+        if isinstance(state, dict):
+            self.head = collections.deque(state['head'])
+            self.segments = collections.deque((path, size) for path, size in state['segments'] if os.path.exists(path))
+            self.tail = collections.deque(state['tail'])
+            self.count = len(self.head) + len(self.tail) + sum(size for _, size in self.segments)
+        else:
+            for url, depth in state:
+                self.push(url, depth)
+
+    def commit(self):
+        for path in self.consumed:
+            os.remove(path)
+        self.consumed = []
+
+class SQLiteFrontier:
+    def __init__(self, filename, node_id=0, nodes=1, lease_timeout=300):
+        self.node_id = node_id
+        self.nodes = nodes
+        self.lease_timeout = lease_timeout
+        self.owner = f"{socket.gethostname()}:{os.getpid()}"
+        # The crawl pass URLs are pushed for; a later pass re-queues URLs an earlier one finished
+        self.generation = 0
+        # Autocommit mode so pops can take an explicit write lock shared with other crawler processes
+        self.conn = sqlite3.connect(filename, timeout=30, isolation_level=None, check_same_thread=False)
+        self.conn.execute('PRAGMA journal_mode=WAL')
+        self.conn.execute('''CREATE TABLE IF NOT EXISTS frontier
+                             (id INTEGER PRIMARY KEY AUTOINCREMENT, url TEXT UNIQUE, depth INTEGER, partition INTEGER,
+                              status TEXT DEFAULT 'queued', lease_owner TEXT, lease_expires REAL,
+                              generation INTEGER DEFAULT 0)''')
+        columns = [row[1] for row in self.conn.execute('PRAGMA table_info(frontier)')]
+        if 'generation' not in columns:
+            # Frontier databases created before scheduled passes were tracked
+            self.conn.execute('ALTER TABLE frontier ADD COLUMN generation INTEGER DEFAULT 0')
+        self.conn.execute('CREATE INDEX IF NOT EXISTS frontier_ready ON frontier (partition, status, id)')
+        self.conn.execute('CREATE INDEX IF NOT EXISTS frontier_status ON frontier (status)')
+        # Each node records when it last polled, so the others can tell when it has stopped for good
+        self.conn.execute('CREATE TABLE IF NOT EXISTS nodes (node_id INTEGER PRIMARY KEY, owner TEXT, last_seen REAL)')
+        self.last_heartbeat = 0
+        self.heartbeat()
+
+    def __len__(self):
+        # Unfinished work across every node, so a node keeps polling while others may still enqueue for it.
+        # Work left by a node that stopped is not counted forever: pop hands it to whoever polls next.
+        self.heartbeat()
+        return self.conn.execute("SELECT COUNT(*) FROM frontier WHERE status != 'done'").fetchone()[0]
+
+    def heartbeat(self):
+        now = time.time()
+        if now - self.last_heartbeat >= self.lease_timeout / 10:
+            self.conn.execute('INSERT OR REPLACE INTO nodes (node_id, owner, last_seen) VALUES (?, ?, ?)',
+                              (self.node_id, self.owner, now))
+            self.last_heartbeat = now
+
+    def stopped_partitions(self, now):
+        # Partitions whose node has not polled for a whole lease timeout
+        return [row[0] for row in self.conn.execute('SELECT node_id FROM nodes WHERE node_id != ? AND last_seen < ?',
+                                                     (self.node_id, now - self.lease_timeout))]
+
+    def partition(self, url):
+        host = urllib.parse.urlsplit(url).netloc.lower()
+        return zlib.crc32(host.encode()) % self.nodes
+
+    def push(self, url, depth):
+        # The url is unique across the whole crawl, so this also acts as the shared visited set within a pass.
+        # A URL left over from an earlier pass is queued again, at the back, as if it were new.
+        self.conn.execute('INSERT INTO frontier (url, depth, partition, generation) VALUES (?, ?, ?, ?) '
+                          "ON CONFLICT(url) DO UPDATE SET depth = excluded.depth, status = 'queued', lease_owner = NULL, "
+                          'lease_expires = NULL, generation = excluded.generation, id = (SELECT MAX(id) FROM frontier) + 1 '
+                          'WHERE frontier.generation < excluded.generation',
+                          (url, depth, self.partition(url), self.generation))
+
+    def pop(self, lifo=False):
+        order = 'DESC' if lifo else 'ASC'
+        self.heartbeat()
+        now = time.time()
+        self.conn.execute('BEGIN IMMEDIATE')
+        try:
+            row = self.conn.execute(f"SELECT id, url, depth FROM frontier WHERE partition = ? AND status = 'queued' "
+                                    f"ORDER BY id {order} LIMIT 1", (self.node_id,)).fetchone()
+            if row is None:
+                # Reclaim URLs leased by a node that crashed or stalled, whichever partition they are in
+                row = self.conn.execute(f"SELECT id, url, depth FROM frontier WHERE status = 'leased' "
+                                        f"AND lease_expires < ? ORDER BY id {order} LIMIT 1", (now,)).fetchone()
+            if row is None:
+                # Take over the queue of a node that stopped polling, so its hosts are not stranded
+                stopped = self.stopped_partitions(now)
+                if stopped:
+                    placeholders = ', '.join('?' * len(stopped))
+                    row = self.conn.execute(f"SELECT id, url, depth FROM frontier WHERE partition IN ({placeholders}) "
+                                            f"AND status = 'queued' ORDER BY id {order} LIMIT 1", stopped).fetchone()
+            if row is not None:
+                self.conn.execute("UPDATE frontier SET status = 'leased', lease_owner = ?, lease_expires = ? WHERE id = ?",
+                                  (self.owner, now + self.lease_timeout, row[0]))
+            self.conn.execute('COMMIT')
+        except Exception:
+            self.conn.execute('ROLLBACK')
+            raise
+        return None if row is None else (row[1], row[2])
+
+    def ack(self, url):
+        self.conn.execute("UPDATE frontier SET status = 'done', lease_owner = NULL, lease_expires = NULL "
+                          "WHERE url = ? AND lease_owner = ?", (url, self.owner))
+
+    def snapshot(self):
+        # Already persisted in the database
+        return None
+
+    def restore(self, entries):
+        pass
+
+    def commit(self):
+        pass
+
+class HostScheduler:
+    def __init__(self, delay_for_url, max_pending=10000):
+        self.delay_for_url = delay_for_url
+        self.max_pending = max_pending
+        self.host_queues = {}
+        self.next_allowed = {}
+        self.ready = []  # heap of (next allowed fetch time, host) for hosts with queued URLs and nothing in flight
+        self.queued = set()
+        self.busy = set()  # hosts with a request in flight; they rejoin the heap when it is released
+
+    def __len__(self):
+        return len(self.queued)
+
+    def __contains__(self, url):
+        return url in self.queued
+
+    def is_full(self):
+        return len(self.queued) >= self.max_pending
+
+    def add(self, url, depth):
+        host = urllib.parse.urlsplit(url).netloc
+        queue = self.host_queues.get(host)
+        if queue is None:
+            queue = self.host_queues[host] = collections.deque()
+            if host not in self.busy:
+                heapq.heappush(self.ready, (self.next_allowed.get(host, 0), host))
+        queue.append((url, depth))
+        self.queued.add(url)
+
+    def pop_ready(self, now):
+        if not self.ready or self.ready[0][0] > now:
+            return None
+        _, host = heapq.heappop(self.ready)
+        queue = self.host_queues[host]
+        url, depth = queue.popleft()
+        self.queued.discard(url)
+        if not queue:
+            del self.host_queues[host]
+        # One request per host at a time; the delay runs from when it finishes, so a slow host is not
+        # sent more requests while it is still answering
+        self.busy.add(host)
+        return url, depth
+
+    def release(self, url, now):
+        host = urllib.parse.urlsplit(url).netloc
+        self.busy.discard(host)
+        self.next_allowed[host] = now + self.delay_for_url(url)
+        if host in self.host_queues:
+            heapq.heappush(self.ready, (self.next_allowed[host], host))
+
+    def entries(self):
+        return [entry for queue in self.host_queues.values() for entry in queue]
+
+    def time_until_ready(self, now):
+        if not self.ready:
+            return None
+        return max(0, self.ready[0][0] - now)
+
 class CSVOutputHandler:
     def __init__(self, filename):
         self.file = open(filename, 'w', newline='')
         self.writer = csv.writer(self.file)
         self.writer.writerow(['URL', 'Title', 'Metadata', 'Content', 'Category'])
 
-    def write(self, url, title, metadata, content, category):
+    def write(self, url, title, metadata, content, category, response=None):
         self.writer.writerow([url, title, json.dumps(metadata), content, category])
 
+    def flush(self):
+        self.file.flush()
+
     def close(self):
         self.file.close()
 
@@ -289,30 +2453,252 @@ class JSONOutputHandler:
         self.file.write('[\n')
         self.first = True
 
-    def write(self, url, title, metadata, content, category):
+    def write(self, url, title, metadata, content, category, response=None):
         if not self.first:
             self.file.write(',\n')
         self.first = False
         json.dump({'url': url, 'title': title, 'metadata': metadata, 'content': content, 'category': category}, self.file)
 
+    def flush(self):
+        self.file.flush()
+
     def close(self):
         self.file.write('\n]')
         self.file.close()
 
+def rotated_filename(filename, part):
+    # results.jsonl.gz, results-00001.jsonl.gz, results-00002.jsonl.gz, ...
+    if part == 0:
+        return filename
+    directory, name = os.path.split(filename)
+    stem, dot, suffix = name.partition('.')
+    return os.path.join(directory, f'{stem}-{part:05d}{dot}{suffix}')
+
+def pass_filename(filename, number):
+    # results.jsonl.gz, results-pass2.jsonl.gz, results-pass3.jsonl.gz, ...
+    directory, name = os.path.split(filename)
+    stem, dot, suffix = name.partition('.')
+    return os.path.join(directory, f'{stem}-pass{number}{dot}{suffix}')
+
+def open_compressed(raw, compression):
+    if compression is None:
+        return raw
+    if compression == 'gzip':
+        return gzip.GzipFile(fileobj=raw, mode='wb')
+    if compression == 'zstd':
+        if zstandard is None:
+            raise ImportError("zstd compression requires zstandard to be installed")
+        return zstandard.ZstdCompressor().stream_writer(raw, closefd=False)
+    raise ValueError(f"Unsupported output compression: {compression}")
+
+class JSONLinesOutputHandler:
+    def __init__(self, filename, compression=None, max_bytes=None):
+        self.filename = filename
+        self.compression = compression
+        self.max_bytes = max_bytes
+        self.part = 0
+        self.open_part()
+
+    def open_part(self):
+        self.raw = open(rotated_filename(self.filename, self.part), 'wb')
+        self.file = open_compressed(self.raw, self.compression)
+
+    def write(self, url, title, metadata, content, category, response=None):
+        record = {'url': url, 'title': title, 'metadata': metadata, 'content': content, 'category': category}
+        self.file.write((json.dumps(record) + '\n').encode('utf-8'))
+        # raw.tell() counts compressed bytes, so parts are split on their size on disk
+        if self.max_bytes and self.raw.tell() >= self.max_bytes:
+            self.close()
+            self.part += 1
+            self.open_part()
+
+    def flush(self):
+        self.file.flush()
+        self.raw.flush()
+
+    def close(self):
+        self.file.close()
+        self.raw.close()
+
+class ParquetOutputHandler:
+    def __init__(self, filename, compression=None, max_bytes=None, row_group_size=10000):
+        if pyarrow is None:
+            raise ImportError("Parquet output requires pyarrow to be installed")
+        self.filename = filename
+        self.compression = compression or 'snappy'
+        self.max_bytes = max_bytes
+        self.row_group_size = row_group_size
+        self.schema = pyarrow.schema([(name, pyarrow.string()) for name in ('url', 'title', 'metadata', 'content', 'category')])
+        self.rows = []
+        self.part = 0
+        self.open_part()
+
+    def open_part(self):
+        self.path = rotated_filename(self.filename, self.part)
+        self.writer = pyarrow.parquet.ParquetWriter(self.path, self.schema, compression=self.compression)
+
+    def write(self, url, title, metadata, content, category, response=None):
+        self.rows.append((url, title, json.dumps(metadata), content, category))
+        if len(self.rows) >= self.row_group_size:
+            self.write_row_group()
+
+    def write_row_group(self):
+        if not self.rows:
+            return
+        columns = [pyarrow.array(column, type=pyarrow.string()) for column in zip(*self.rows)]
+        self.writer.write_table(pyarrow.Table.from_arrays(columns, schema=self.schema))
+        self.rows = []
+        if self.max_bytes and os.path.getsize(self.path) >= self.max_bytes:
+            self.writer.close()
+            self.part += 1
+            self.open_part()
+
+    def flush(self):
+        # A part only becomes readable once its footer is written on close; this just bounds buffered rows
+        self.write_row_group()
+
+    def close(self):
+        self.write_row_group()
+        self.writer.close()
+
+# The body is stored decoded and re-encoded as UTF-8, so headers describing the bytes on the wire are rewritten
+WIRE_HEADERS = {'content-encoding', 'content-length', 'content-type', 'transfer-encoding'}
+
+def http_response(content, status, headers):
+    body = content.encode('utf-8')
+    try:
+        reason = http.HTTPStatus(status).phrase
+    except ValueError:
+        reason = ''
+    media_type = headers.get('content-type', 'text/html').split(';')[0].strip()
+    lines = [f'HTTP/1.1 {status} {reason}'.rstrip()]
+    lines.extend(f'{name}: {value}' for name, value in headers.items() if name.lower() not in WIRE_HEADERS)
+    lines.append(f'Content-Type: {media_type}; charset=utf-8')
+    lines.append(f'Content-Length: {len(body)}')
+    # HTTP headers are Latin-1, which is also how requests and aiohttp decoded them
+    return ('\r\n'.join(lines) + '\r\n\r\n').encode('latin-1', 'replace') + body
+
+class WARCOutputHandler:
+    def __init__(self, filename, compression=None, max_bytes=None):
+        if compression not in (None, 'gzip'):
+            raise ValueError(f"Unsupported WARC compression: {compression}")
+        self.filename = filename
+        self.compression = compression
+        self.max_bytes = max_bytes
+        self.part = 0
+        self.open_part()
+
+    def open_part(self):
+        path = rotated_filename(self.filename, self.part)
+        self.file = open(path, 'wb')
+        self.write_record('warcinfo', None, 'application/warc-fields',
+                          'software: AdvancedWebCrawler\r\nformat: WARC File Format 1.1\r\n'.encode('utf-8'),
+                          {'WARC-Filename': os.path.basename(path)})
+
+    def write(self, url, title, metadata, content, category, response=None):
+        if response is None:
+            # Content rendered in a browser has no HTTP response to record
+            record_id = self.write_record('resource', url, 'text/html; charset=utf-8', content.encode('utf-8'))
+        else:
+            record_id = self.write_record('response', url, 'application/http; msgtype=response', http_response(content, *response))
+        details = json.dumps({'title': title, 'metadata': metadata, 'category': category}).encode('utf-8')
+        self.write_record('metadata', url, 'application/json', details, {'WARC-Concurrent-To': record_id})
+        if self.max_bytes and self.file.tell() >= self.max_bytes:
+            self.file.close()
+            self.part += 1
+            self.open_part()
+
+    def write_record(self, record_type, url, content_type, payload, extra_headers=None):
+        record_id = f'<urn:uuid:{uuid.uuid4()}>'
+        headers = {
+            'WARC-Type': record_type,
+            'WARC-Record-ID': record_id,
+            'WARC-Date': datetime.datetime.now(datetime.timezone.utc).strftime('%Y-%m-%dT%H:%M:%SZ'),
+        }
+        if url is not None:
+            headers['WARC-Target-URI'] = url
+        headers.update(extra_headers or {})
+        headers['Content-Type'] = content_type
+        headers['Content-Length'] = str(len(payload))
+        head = 'WARC/1.1\r\n' + ''.join(f'{name}: {value}\r\n' for name, value in headers.items()) + '\r\n'
+        record = head.encode('utf-8') + payload + b'\r\n\r\n'
+        # One gzip member per record, as .warc.gz readers expect, so records can be read by offset
+        self.file.write(gzip.compress(record) if self.compression == 'gzip' else record)
+        return record_id
+
+    def flush(self):
+        self.file.flush()
+
+    def close(self):
+        self.file.close()
+
 class SQLiteOutputHandler:
-    def __init__(self, filename):
-        self.conn = sqlite3.connect(filename)
-        self.cursor = self.conn.cursor()
-        self.cursor.execute('''CREATE TABLE IF NOT EXISTS pages
-                               (url TEXT PRIMARY KEY, title TEXT, metadata TEXT, content TEXT, category TEXT)''')
-
-    def write(self, url, title, metadata, content, category):
-        self.cursor.execute('INSERT OR REPLACE INTO pages VALUES (?, ?, ?, ?, ?)',
-                            (url, title, json.dumps(metadata), content, category))
+    def __init__(self, filename, batch_size=500, flush_interval=1.0):
+        self.batch_size = batch_size
+        self.flush_interval = flush_interval
+        self.conn = sqlite3.connect(filename, check_same_thread=False)
+        self.conn.execute('PRAGMA journal_mode=WAL')
+        self.conn.execute('PRAGMA synchronous=NORMAL')
+        self.conn.execute('''CREATE TABLE IF NOT EXISTS pages
+                             (url TEXT PRIMARY KEY, title TEXT, metadata TEXT, content TEXT, category TEXT)''')
         self.conn.commit()
+        # Bounded so a stalled disk pushes back on the crawl instead of buffering pages without limit
+        self.queue = queue.Queue(maxsize=batch_size * 10)
+        self.error = None
+        self.writer = threading.Thread(target=self.run, name='sqlite-output-writer', daemon=True)
+        self.writer.start()
+
+    def write(self, url, title, metadata, content, category, response=None):
+        self.raise_writer_error()
+        self.queue.put((url, title, json.dumps(metadata), content, category))
+
+    def flush(self):
+        # Block until everything written so far is committed
+        done = threading.Event()
+        self.queue.put(done)
+        done.wait()
+        self.raise_writer_error()
 
     def close(self):
+        self.queue.put(None)
+        self.writer.join()
         self.conn.close()
+        self.raise_writer_error()
+
+    def raise_writer_error(self):
+        if self.error is not None:
+            raise RuntimeError('SQLite output writer failed') from self.error
+
+    def run(self):
+        batch = []
+        deadline = None
+        while True:
+            timeout = None if not batch else max(0, deadline - time.monotonic())
+            try:
+                item = self.queue.get(timeout=timeout)
+            except queue.Empty:
+                item = False
+            if isinstance(item, tuple):
+                if not batch:
+                    deadline = time.monotonic() + self.flush_interval
+                batch.append(item)
+                if len(batch) < self.batch_size:
+                    continue
+            self.commit_batch(batch)
+            batch = []
+            if isinstance(item, threading.Event):
+                item.set()
+            elif item is None:
+                return
+
+    def commit_batch(self, batch):
+        if not batch or self.error is not None:
+            return
+        try:
+            with self.conn:
+                self.conn.executemany('INSERT OR REPLACE INTO pages VALUES (?, ?, ?, ?, ?)', batch)
+        except sqlite3.Error as e:
+            self.error = e
 
 def load_config(config_file):
     with open(config_file, 'r') as f:
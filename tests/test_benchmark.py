@@ -0,0 +1,38 @@
+import unittest
+
+from benchmark import SyntheticSite, compare
+
+class TestSyntheticSite(unittest.TestCase):
+
+    def setUp(self):
+        self.site = SyntheticSite(pages=20, fan_out=3, page_size=2000, error_rate=0.3, hosts=2, seed=1)
+        self.site.ports = [8001, 8002]
+
+    def test_pages_are_deterministic(self):
+        self.assertEqual(self.site.render(4), self.site.render(4))
+        status, body = next(page for page in map(self.site.render, range(20)) if page[0] == 200)
+        self.assertGreaterEqual(len(body), 2000)
+        self.assertIn('/private/', body)
+
+    def test_error_rate_and_bounds(self):
+        statuses = [self.site.render(number)[0] for number in range(20)]
+        self.assertIn(500, statuses)
+        self.assertIn(200, statuses)
+        self.assertEqual(self.site.render(20)[0], 404)
+
+    def test_links_spread_across_hosts(self):
+        status, body = next(page for page in map(self.site.render, range(20)) if page[0] == 200)
+        self.assertIn('http://127.0.0.1:8001/', body)
+        self.assertIn('http://127.0.0.1:8002/', body)
+
+class TestCompare(unittest.TestCase):
+
+    def test_flags_throughput_regressions(self):
+        baseline = {'a': {'pages_per_second': 100}, 'b': {'pages_per_second': 100}, 'c': {'error': 'failed'}}
+        results = {'a': {'pages_per_second': 95}, 'b': {'pages_per_second': 80}, 'c': {'pages_per_second': 1}}
+        regressions = compare(results, baseline, tolerance=0.1)
+        self.assertEqual(len(regressions), 1)
+        self.assertTrue(regressions[0].startswith('b:'))
+
+if __name__ == '__main__':
+    unittest.main()
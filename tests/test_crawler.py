@@ -1,17 +1,39 @@
+import asyncio
+import collections
+import gzip
 import unittest
 from unittest.mock import Mock, patch, MagicMock
 import tempfile
+import threading
+import time
 import os
 import json
+import pickle
+import random
+import smtplib
+import sqlite3
+import sys
+import urllib.request
+import requests
 import yaml
 from bs4 import BeautifulSoup
+from selenium.common.exceptions import WebDriverException
 
 # Import the classes and functions we want to test
-from crawler import AdvancedWebCrawler, CSVOutputHandler, JSONOutputHandler, SQLiteOutputHandler, load_config
+from crawler import AdvancedWebCrawler, ChangeIndex, HostScheduler, content_signature, simhash, RobotsCache, DiskFrontier, SQLiteFrontier, PriorityFrontier, ProxyPool, is_proxy_failure, URLSeenStore, BloomURLSeenStore, canonicalize_url, analyze_html, CSVOutputHandler, JSONOutputHandler, JSONLinesOutputHandler, ParquetOutputHandler, WARCOutputHandler, SQLiteOutputHandler, BrowserPool, BodyDecoder, ResponseTooLarge, CrawlMetrics, MetricsServer, PluginPipeline, ChangeNotifier, LanguageProfiles, TextClassifier, looks_js_dependent, load_config
+
+def fake_response(text='', status_code=200, headers=None, chunk_size=7):
+    body = text.encode('utf-8')
+    response = Mock(status_code=status_code, ok=status_code < 400, headers=headers or {'content-type': 'text/html'})
+    response.iter_content.side_effect = lambda **kwargs: (body[i:i + chunk_size] for i in range(0, len(body), chunk_size))
+    return response
 
 class TestAdvancedWebCrawler(unittest.TestCase):
 
     def setUp(self):
+        # Keep checkpoints out of the working directory so tests can't resume each other's state
+        self.state_dir = tempfile.TemporaryDirectory()
+        self.addCleanup(self.state_dir.cleanup)
         self.config = {
             'url': 'https://example.com',
             'depth': 2,
@@ -21,7 +43,9 @@ class TestAdvancedWebCrawler(unittest.TestCase):
             'log_level': 'INFO',
             'delay': 1,
             'threads': 5,
-            'breadth': 100
+            'breadth': 100,
+            'change_index': ':memory:',
+            'state_file': os.path.join(self.state_dir.name, 'crawler_state.pkl')
         }
         self.crawler = AdvancedWebCrawler(self.config)
 
@@ -31,14 +55,10 @@ class TestAdvancedWebCrawler(unittest.TestCase):
         self.assertIsNotNone(self.crawler.rp)
         self.assertIsNotNone(self.crawler.output_handler)
 
-    @patch('crawler.RobotFileParser')
-    def test_setup_robotparser(self, mock_robotparser):
-        mock_rp = Mock()
-        mock_robotparser.return_value = mock_rp
+    def test_setup_robotparser(self):
         rp = self.crawler.setup_robotparser()
-        mock_rp.set_url.assert_called_once_with('https://example.com/robots.txt')
-        mock_rp.read.assert_called_once()
-        self.assertEqual(rp, mock_rp)
+        self.assertIsInstance(rp, RobotsCache)
+        self.assertIs(rp.session, self.crawler.session)
 
     def test_setup_output_handler(self):
         self.assertIsInstance(self.crawler.output_handler, CSVOutputHandler)
@@ -65,11 +85,286 @@ class TestAdvancedWebCrawler(unittest.TestCase):
         self.assertEqual(new_links, ['https://example.com/page2'])
         self.assertEqual(title, 'No title')
 
+    def test_process_url_revalidates_with_conditional_get(self):
+        self.crawler.config['revalidate'] = True
+        self.crawler.rp = Mock()
+        self.crawler.rp.can_fetch.return_value = True
+        self.crawler.output_handler = Mock()
+        self.crawler.session = Mock()
+        self.crawler.session.get.return_value = fake_response(
+            '<html><body><a href="https://example.com/page2">Link</a></body></html>',
+            headers={'content-type': 'text/html', 'ETag': '"v1"', 'Last-Modified': 'Wed, 01 May 2024 12:00:00 GMT'})
+        self.crawler.process_url('https://example.com', 0)
+
+        self.crawler.session.get.return_value = fake_response(status_code=304)
+        new_links, title = self.crawler.process_url('https://example.com', 0)
+
+        headers = self.crawler.session.get.call_args.kwargs['headers']
+        self.assertEqual(headers, {'If-None-Match': '"v1"', 'If-Modified-Since': 'Wed, 01 May 2024 12:00:00 GMT'})
+        self.assertEqual(new_links, ['https://example.com/page2'])
+        self.assertIsNone(title)
+        self.assertEqual(self.crawler.output_handler.write.call_count, 1)
+
+    def test_first_pass_fetches_in_full_without_revalidate(self):
+        # The output of an earlier run was truncated, so unchanged pages must be written again
+        self.crawler.config['adaptive_revisit'] = True
+        self.crawler.rp = Mock()
+        self.crawler.rp.can_fetch.return_value = True
+        self.crawler.output_handler = Mock()
+        self.crawler.session = Mock()
+        self.crawler.change_index.record_revisit('https://example.com', '"v1"', None, [], False)
+        self.crawler.session.get.return_value = fake_response('<html><body><p>Hello</p></body></html>')
+
+        self.crawler.process_url('https://example.com', 0)
+
+        self.assertEqual(self.crawler.session.get.call_args.kwargs['headers'], {})
+        self.crawler.output_handler.write.assert_called_once()
+        # The response status and headers go to the output handler, e.g. for WARC response records
+        self.assertEqual(self.crawler.output_handler.write.call_args.args[5], (200, {'content-type': 'text/html'}))
+
+        self.crawler.finished_passes = 1
+        self.crawler.session.get.reset_mock()
+        self.crawler.process_url('https://example.com', 0)
+        self.crawler.session.get.assert_not_called()
+
+    def test_scheduled_passes_write_separate_output_files(self):
+        with tempfile.TemporaryDirectory() as temp_dir:
+            output = os.path.join(temp_dir, 'output.csv')
+            crawler = AdvancedWebCrawler(dict(self.config, output=output, delay=0))
+
+            def fake_process_url(url, depth):
+                crawler.output_handler.write(url, f'Pass {crawler.finished_passes + 1}', {}, '', 'en')
+                return [], 'Title'
+
+            crawler.process_url = fake_process_url
+            with patch.object(crawler, 'save_state'):
+                crawler.crawl()
+                crawler.crawl()
+
+            with open(output) as f:
+                self.assertIn('Pass 1', f.read())
+            with open(os.path.join(temp_dir, 'output-pass2.csv')) as f:
+                self.assertIn('Pass 2', f.read())
+
+    def test_scheduled_pass_reports_its_own_metrics(self):
+        crawler = AdvancedWebCrawler(dict(self.config, delay=0, output=os.path.join(self.state_dir.name, 'output.csv')))
+
+        def fake_process_url(url, depth):
+            crawler.metrics.increment('pages')
+            return [], 'Title'
+
+        crawler.process_url = fake_process_url
+        crawler.crawl()
+        crawler.crawl()
+        self.assertEqual(crawler.metrics.pass_snapshot()['pages'], 1)
+        self.assertEqual(crawler.metrics.snapshot()['pages'], 2)
+
+    def test_scheduled_pass_reruns_on_sqlite_frontier(self):
+        with tempfile.TemporaryDirectory() as temp_dir:
+            crawler = AdvancedWebCrawler(dict(self.config, delay=0, frontier='sqlite',
+                                              frontier_path=os.path.join(temp_dir, 'frontier.db')))
+            crawler.output_handler = Mock()
+            crawled = []
+
+            def fake_process_url(url, depth):
+                crawled.append(url)
+                return ['https://example.com/a'] if depth == 0 else [], 'Title'
+
+            crawler.process_url = fake_process_url
+            with patch.object(crawler, 'save_state'), patch.object(crawler, 'setup_output_handler', return_value=Mock()):
+                crawler.crawl()
+                crawler.crawl()
+
+            self.assertEqual(crawled, ['https://example.com', 'https://example.com/a'] * 2)
+
+    def test_adaptive_revisit_skips_pages_not_due(self):
+        self.crawler.config['adaptive_revisit'] = True
+        self.crawler.config['revalidate'] = True
+        self.crawler.rp = Mock()
+        self.crawler.rp.can_fetch.return_value = True
+        self.crawler.session = Mock()
+        self.crawler.change_index.record_revisit('https://example.com', None, None, ['https://example.com/page2'], False)
+
+        new_links, title = self.crawler.process_url('https://example.com', 0)
+
+        self.crawler.session.get.assert_not_called()
+        self.assertEqual(new_links, ['https://example.com/page2'])
+
+    def test_crawl_starts_new_pass_when_rerun(self):
+        self.crawler.config['delay'] = 0
+        self.crawler.output_handler = Mock()
+        crawled = []
+
+        def fake_process_url(url, depth):
+            crawled.append(url)
+            return [], 'Title'
+
+        with patch.object(self.crawler, 'process_url', side_effect=fake_process_url), \
+                patch.object(self.crawler, 'save_state'), \
+                patch.object(self.crawler, 'setup_output_handler', return_value=Mock()):
+            self.crawler.crawl()
+            self.crawler.crawl()
+
+        self.assertEqual(crawled, ['https://example.com', 'https://example.com'])
+
+    def test_render_js_auto_only_renders_js_dependent_pages(self):
+        self.crawler.config['render_js'] = 'auto'
+        self.crawler.rp = Mock()
+        self.crawler.rp.can_fetch.return_value = True
+        self.crawler.output_handler = Mock()
+        self.crawler.session = Mock()
+        self.crawler.browser_pool = Mock()
+        self.crawler.browser_pool.fetch.return_value = ('<html><body><a href="/page2">Link</a></body></html>', 'Rendered')
+
+        self.crawler.session.get.return_value = fake_response('<html><body><p>Static page</p></body></html>')
+        self.crawler.process_url('https://example.com/static', 0)
+        self.crawler.browser_pool.fetch.assert_not_called()
+
+        self.crawler.session.get.return_value = fake_response(
+            '<html><body><div id="app"></div><script src="app.js"></script></body></html>')
+        new_links, title = self.crawler.process_url('https://example.com/app', 0)
+        self.crawler.browser_pool.fetch.assert_called_once_with('https://example.com/app')
+        self.assertEqual(new_links, ['https://example.com/page2'])
+        self.assertEqual(title, 'Rendered')
+
+    def test_is_allowed_extension_only_skips_known_media(self):
+        self.crawler.config['content_types'] = ['text/html', 'application/pdf']
+        for path in ('/cgi-bin/x.pl', '/index.php', '/script.py', '/page.html', '/docs/Guide.PDF', '/dir/'):
+            self.assertTrue(self.crawler.is_allowed_extension(f'https://example.com{path}'), path)
+        for path in ('/video.mp4', '/photo.JPG', '/archive.tar.gz', '/setup.exe'):
+            self.assertFalse(self.crawler.is_allowed_extension(f'https://example.com{path}?x=1'), path)
+
+    def test_process_url_rejects_by_headers_before_reading_body(self):
+        self.crawler.config['content_types'] = ['text/html']
+        self.crawler.config['max_body_size'] = 100
+        self.crawler.rp = Mock()
+        self.crawler.rp.can_fetch.return_value = True
+        self.crawler.session = Mock()
+
+        self.assertEqual(self.crawler.process_url('https://example.com/video.mp4', 0), ([], None))
+        self.crawler.session.get.assert_not_called()
+
+        for headers in ({'content-type': 'application/pdf'}, {'content-type': 'text/html', 'content-length': '5000'}):
+            response = fake_response('<html></html>', headers=headers)
+            self.crawler.session.get.return_value = response
+            self.assertEqual(self.crawler.process_url('https://example.com/file', 0), ([], None))
+            response.iter_content.assert_not_called()
+            response.close.assert_called_once()
+
+        self.crawler.session.get.return_value = fake_response('<html>' + 'x' * 200 + '</html>')
+        self.assertEqual(self.crawler.process_url('https://example.com/big', 0), ([], None))
+        self.assertEqual(self.crawler.session.get.call_args.kwargs['stream'], True)
+
+    def test_process_url_retries_on_another_proxy(self):
+        self.crawler.rp = Mock()
+        self.crawler.rp.can_fetch.return_value = True
+        self.crawler.output_handler = Mock()
+        self.crawler.proxy_list = ['http://bad:8080', 'http://good:8080']
+        self.crawler.proxy_pool = ProxyPool(self.crawler.proxy_list, session_factory=Mock, failure_threshold=1)
+        bad, good = (self.crawler.proxy_pool.session(proxy) for proxy in self.crawler.proxy_list)
+        bad.get.side_effect = requests.exceptions.ProxyError('tunnel failed')
+        good.get.side_effect = lambda *args, **kwargs: fake_response(
+            '<html><body><a href="https://example.com/page2">Link</a></body></html>')
+
+        with patch.object(self.crawler.proxy_pool, 'choose', side_effect=['http://bad:8080', 'http://good:8080']):
+            new_links, _ = self.crawler.process_url('https://example.com', 0)
+
+        self.assertEqual(new_links, ['https://example.com/page2'])
+        self.assertEqual(self.crawler.broken_links, [])
+        self.assertIn('http://bad:8080', self.crawler.proxy_pool.ejected_until)
+        self.assertIsNotNone(self.crawler.proxy_pool.latency['http://good:8080'])
+
+        self.crawler.proxy_pool.sessions['http://bad:8080'] = bad
+        bad.get.side_effect = good.get.side_effect = requests.exceptions.ConnectTimeout('timed out')
+        self.assertEqual(self.crawler.process_url('https://example.com/other', 0), ([], None))
+        self.assertEqual(self.crawler.broken_links, [])
+        self.assertEqual(self.crawler.metrics.counters['proxy_errors'], 1)
+
+    def test_target_failures_behind_a_proxy_are_broken_links(self):
+        self.crawler.rp = Mock()
+        self.crawler.rp.can_fetch.return_value = True
+        self.crawler.proxy_list = ['http://a:8080', 'http://b:8080']
+        self.crawler.proxy_pool = ProxyPool(self.crawler.proxy_list, session_factory=Mock, failure_threshold=1)
+        errors = [
+            requests.exceptions.ProxyError("Unable to connect to proxy, OSError('Tunnel connection failed: 502 Bad Gateway')"),
+            requests.exceptions.ReadTimeout('read timed out'),
+            requests.exceptions.ConnectionError('Connection reset by peer'),
+        ]
+        for proxy in self.crawler.proxy_list:
+            self.crawler.proxy_pool.session(proxy).get.side_effect = errors
+
+        for i in range(len(errors)):
+            self.assertEqual(self.crawler.process_url(f'https://down.example/{i}', 0), ([], None))
+
+        self.assertEqual(len(self.crawler.broken_links), 3)
+        self.assertEqual(self.crawler.proxy_pool.healthy_count(), 2)
+        self.assertEqual(self.crawler.metrics.counters['proxy_errors'], 0)
+        self.assertTrue(is_proxy_failure(requests.exceptions.ProxyError(
+            "Unable to connect to proxy, OSError('Tunnel connection failed: 407 Proxy Authentication Required')")))
+
+    def test_head_precheck(self):
+        self.crawler.config['content_types'] = ['text/html']
+        self.crawler.config['head_precheck'] = True
+        self.crawler.rp = Mock()
+        self.crawler.rp.can_fetch.return_value = True
+        self.crawler.session = Mock()
+        self.crawler.session.head.return_value = fake_response(headers={'content-type': 'application/zip'})
+
+        self.assertEqual(self.crawler.process_url('https://example.com/download', 0), ([], None))
+        self.crawler.session.get.assert_not_called()
+
+    def test_process_content_records_stage_timings(self):
+        self.crawler.output_handler = Mock()
+        self.crawler.process_content('https://example.com', '<html><body><a href="/page2">Link</a></body></html>')
+
+        snapshot = self.crawler.metrics.snapshot()
+        self.assertEqual(snapshot['pages'], 1)
+        for stage in ('parse', 'classify', 'change_detection', 'plugins', 'output'):
+            self.assertEqual(snapshot['stages'][stage]['count'], 1)
+
     def test_extract_links(self):
         content = '<html><body><a href="https://example.com/page2">Link</a></body></html>'
         links = self.crawler.extract_links('https://example.com', content)
         self.assertEqual(links, ['https://example.com/page2'])
 
+    def test_process_content_parses_page_once(self):
+        content = '<html><head><title>Home</title><meta name="description" content="Test page"></head>' \
+                  '<body><a href="/page2">Link</a></body></html>'
+        plugin = Mock(spec=['process_page'])
+        self.crawler.plugins = [plugin]
+        self.crawler.output_handler = Mock()
+
+        with patch('crawler.BeautifulSoup', wraps=BeautifulSoup) as mock_soup:
+            new_links, title = self.crawler.process_content('https://example.com', content)
+
+        mock_soup.assert_called_once()
+        self.assertEqual(new_links, ['https://example.com/page2'])
+        self.assertEqual(title, 'Home')
+        page = plugin.process_page.call_args[0][2]
+        self.assertEqual(page.metadata, {'description': 'Test page'})
+        self.crawler.output_handler.write.assert_called_once()
+
+    def test_process_content_in_parse_pool(self):
+        self.crawler.config['parse_processes'] = 2
+        self.crawler.output_handler = Mock()
+        self.crawler.parse_pool = self.crawler.setup_parse_pool()
+        self.assertNotEqual(self.crawler.parse_pool._mp_context.get_start_method(), 'fork')
+        try:
+            new_links, title = self.crawler.process_content(
+                'https://example.com', '<html><head><title>Home</title></head><body><a href="/a">A</a></body></html>')
+        finally:
+            self.crawler.parse_pool.shutdown()
+
+        self.assertEqual(new_links, ['https://example.com/a'])
+        self.assertEqual(title, 'Home')
+        self.assertIsNotNone(self.crawler.output_handler.write.call_args[0][4])
+
+    def test_parse_pool_is_shut_down_after_crawl(self):
+        self.crawler.config['parse_processes'] = 1
+        self.crawler.process_url = lambda url, depth: ([], 'Title')
+        self.crawler.crawl_breadth_first()
+        self.assertIsNone(self.crawler.parse_pool)
+
     def test_is_allowed_url(self):
         self.crawler.config['exclude_patterns'] = ['/admin', '/login']
         self.assertTrue(self.crawler.is_allowed_url('https://example.com/page'))
@@ -87,7 +382,7 @@ class TestAdvancedWebCrawler(unittest.TestCase):
         metadata = self.crawler.extract_metadata(content)
         self.assertEqual(metadata, {'description': 'Test page'})
 
-    @patch('crawler.TextCat.classify')
+    @patch('crawler.TextClassifier.classify_uncached')
     def test_categorize_content(self, mock_classify):
         mock_classify.return_value = 'English'
         category = self.crawler.categorize_content('<html><body>Hello, world!</body></html>')
@@ -102,24 +397,146 @@ class TestAdvancedWebCrawler(unittest.TestCase):
         self.assertTrue(self.crawler.should_detect_changes(url, content2))
         self.assertFalse(self.crawler.should_detect_changes(url, content2))
 
+    def test_skip_near_duplicate_output(self):
+        self.crawler.config['skip_near_duplicates'] = True
+        self.crawler.output_handler = Mock()
+        content = '<html><body><p>' + ' '.join(f'word{chr(97 + i % 26)}x' for i in range(200)) + '</p></body></html>'
+
+        self.crawler.process_content('https://example.com/a', content)
+        self.crawler.process_content('https://example.com/b', content.replace('</p>', ' Updated 12:03</p>'))
+
+        self.crawler.output_handler.write.assert_called_once()
+
+        # A later pass still writes the page that was kept, and still skips its duplicate
+        self.crawler.process_content('https://example.com/a', content)
+        self.crawler.process_content('https://example.com/b', content.replace('</p>', ' Updated 12:03</p>'))
+        self.assertEqual([call.args[0] for call in self.crawler.output_handler.write.call_args_list],
+                         ['https://example.com/a', 'https://example.com/a'])
+
     @patch('crawler.smtplib.SMTP')
     def test_send_email(self, mock_smtp):
         self.crawler.config['notification_email'] = 'user@example.com'
         self.crawler.send_email('Test Subject', 'Test Body')
         mock_smtp.return_value.send_message.assert_called_once()
 
+    def test_process_content_hands_pages_to_plugin_pipeline(self):
+        plugin = Mock(spec=['process_page'])
+        self.crawler.plugins = [plugin]
+        self.crawler.output_handler = Mock()
+        self.crawler.plugin_pipeline = self.crawler.setup_plugin_pipeline()
+
+        self.crawler.process_content('https://example.com', '<html><body><p>Hello</p></body></html>')
+        self.crawler.plugin_pipeline.close()
+
+        plugin.process_page.assert_called_once()
+        self.assertEqual(self.crawler.metrics.snapshot()['stages']['plugin_run']['count'], 1)
+
     @patch('crawler.pickle.dump')
     def test_save_state(self, mock_dump):
         self.crawler.save_state()
         mock_dump.assert_called_once()
 
-    @patch('crawler.pickle.load')
-    @patch('crawler.os.path.exists')
-    def test_load_state(self, mock_exists, mock_load):
-        mock_exists.return_value = True
-        mock_load.return_value = {'visited': set(), 'to_visit': [], 'content_store': {}}
+    def test_load_state(self):
+        self.assertFalse(self.crawler.load_state())
+        with open(self.crawler.state_file, 'wb') as f:
+            pickle.dump({'visited': {'https://example.com/a'}, 'to_visit': [], 'content_store': {}}, f)
         self.assertTrue(self.crawler.load_state())
-        mock_load.assert_called_once()
+        self.assertIn('https://example.com/a', self.crawler.visited)
+
+    def test_save_state_replaces_snapshot_atomically(self):
+        with tempfile.TemporaryDirectory() as temp_dir:
+            self.crawler.state_file = os.path.join(temp_dir, 'state.pkl')
+            self.crawler.save_state([('https://example.com/pending', 1)])
+
+            self.assertCountEqual(os.listdir(temp_dir), ['state.pkl', 'state.pkl.seen'])
+            with open(self.crawler.state_file, 'rb') as f:
+                state = pickle.load(f)
+            self.assertEqual(state['to_visit'], [('https://example.com', 0)])
+            self.assertEqual(state['pending'], [('https://example.com/pending', 1)])
+
+    def test_save_state_flushes_output_under_output_lock(self):
+        with tempfile.TemporaryDirectory() as temp_dir:
+            self.crawler.state_file = os.path.join(temp_dir, 'state.pkl')
+            self.crawler.output_handler = Mock()
+            self.crawler.output_handler.flush.side_effect = lambda: self.assertTrue(self.crawler.output_lock.locked())
+            self.crawler.save_state()
+            self.crawler.output_handler.flush.assert_called_once()
+
+    def test_save_state_appends_only_new_seen_urls(self):
+        seen_file = self.crawler.state_file + '.seen'
+        self.crawler.save_state()
+        self.assertEqual(os.path.getsize(seen_file), 8)
+        self.crawler.visited.add('https://example.com/a')
+        self.crawler.save_state()
+        self.assertEqual(os.path.getsize(seen_file), 16)
+        self.crawler.save_state()
+        self.assertEqual(os.path.getsize(seen_file), 16)
+
+        # Fingerprints appended after the last snapshot are dropped on resume
+        self.crawler.visited.add('https://example.com/b')
+        self.crawler.save_seen_store()
+        resumed = AdvancedWebCrawler(self.config)
+        self.assertTrue(resumed.load_state())
+        self.assertIn('https://example.com/a', resumed.visited)
+        self.assertNotIn('https://example.com/b', resumed.visited)
+        self.assertEqual(os.path.getsize(seen_file), 16)
+
+    def test_resume_replays_write_ahead_log(self):
+        with tempfile.TemporaryDirectory() as temp_dir:
+            config = dict(self.config, state_file=os.path.join(temp_dir, 'state.pkl'), delay=0)
+            crashed = AdvancedWebCrawler(config)
+            crashed.save_state()
+            crashed.wal = open(crashed.state_file + '.wal', 'a')
+            crashed.frontier.pop()
+            crashed.finish_url('https://example.com', 0, ['https://example.com/a', 'https://example.com/b'], False)
+            crashed.wal.write('["enqueue", "https://exa')  # torn write
+            crashed.wal.close()
+
+            resumed = AdvancedWebCrawler(config)
+            self.assertTrue(resumed.load_state())
+            crawled = []
+
+            def fake_process_url(url, depth):
+                crawled.append(url)
+                return [], 'Title'
+
+            resumed.process_url = fake_process_url
+            resumed.crawl_breadth_first()
+            self.assertEqual(crawled, ['https://example.com/a', 'https://example.com/b'])
+
+    def test_resume_remembers_done_urls_across_checkpoints(self):
+        with tempfile.TemporaryDirectory() as temp_dir:
+            config = dict(self.config, state_file=os.path.join(temp_dir, 'state.pkl'), delay=0,
+                          checkpoint_interval=0, scheduler_queue_size=1)
+            crashed = AdvancedWebCrawler(config)
+            crashed.save_state()
+            crashed.wal = open(crashed.state_file + '.wal', 'a')
+            crashed.frontier.pop()
+            crashed.finish_url('https://example.com', 0, ['https://example.com/b', 'https://example.com/a'], False)
+            crashed.frontier.pop()
+            crashed.frontier.pop()
+            crashed.finish_url('https://example.com/a', 1, [], False)
+            crashed.wal.close()
+
+            resumed = AdvancedWebCrawler(config)
+            self.assertTrue(resumed.load_state())
+            crawled = []
+
+            def fake_process_url(url, depth):
+                crawled.append(url)
+                return [], 'Title'
+
+            resumed.process_url = fake_process_url
+            resumed.crawl_breadth_first()
+            self.assertEqual(crawled, ['https://example.com/b'])
+
+    def test_crawl_writes_periodic_checkpoints(self):
+        with tempfile.TemporaryDirectory() as temp_dir:
+            self.crawler.config.update({'delay': 0, 'checkpoint_interval': 0})
+            self.crawler.state_file = os.path.join(temp_dir, 'state.pkl')
+            self.crawler.process_url = lambda url, depth: ([], 'Title')
+            self.crawler.crawl_breadth_first()
+            self.assertTrue(os.path.exists(self.crawler.state_file))
 
     @patch('crawler.importlib.util.spec_from_file_location')
     @patch('crawler.importlib.util.module_from_spec')
@@ -135,6 +552,917 @@ class TestAdvancedWebCrawler(unittest.TestCase):
         plugins = self.crawler.load_plugins()
         self.assertEqual(len(plugins), 2)
 
+    def test_crawl_breadth_first_runs_fetches_concurrently(self):
+        self.crawler.config['delay'] = 0
+        active = []
+        peak = []
+        crawled = []
+        lock = threading.Lock()
+
+        def fake_process_url(url, depth):
+            with lock:
+                active.append(url)
+                peak.append(len(active))
+            time.sleep(0.05)
+            with lock:
+                active.remove(url)
+            crawled.append(url)
+            if depth == 0:
+                # One request at a time per host, so concurrency comes from crawling several hosts
+                return [f'https://host{i}.example/page' for i in range(5)], 'Title'
+            return [], 'Title'
+
+        self.crawler.process_url = fake_process_url
+        self.crawler.crawl_breadth_first()
+
+        self.assertEqual(len(crawled), 6)
+        self.assertGreater(max(peak), 1)
+        self.assertLessEqual(max(peak), self.config['threads'])
+
+    def test_crawl_depth_first_respects_depth_and_order(self):
+        self.crawler.config['depth'] = 1
+        self.crawler.config['threads'] = 1
+        self.crawler.config['delay'] = 0
+        order = []
+
+        def fake_process_url(url, depth):
+            order.append((url, depth))
+            return [f'{url}/a', f'{url}/b'], 'Title'
+
+        self.crawler.process_url = fake_process_url
+        self.crawler.crawl_depth_first()
+
+        self.assertEqual(order, [
+            ('https://example.com', 0),
+            ('https://example.com/a', 1),
+            ('https://example.com/b', 1),
+        ])
+
+    def test_crawl_depth_first_goes_deep_before_siblings(self):
+        self.crawler.config['depth'] = 2
+        self.crawler.config['threads'] = 1
+        self.crawler.config['delay'] = 0
+        order = []
+
+        def fake_process_url(url, depth):
+            order.append(url)
+            return [f'{url}/a', f'{url}/b'], 'Title'
+
+        self.crawler.process_url = fake_process_url
+        self.crawler.crawl_depth_first()
+
+        self.assertEqual(order, [
+            'https://example.com',
+            'https://example.com/a', 'https://example.com/a/a', 'https://example.com/a/b',
+            'https://example.com/b', 'https://example.com/b/a', 'https://example.com/b/b',
+        ])
+
+    def test_crawl_priority_prefers_high_value_links(self):
+        crawler = AdvancedWebCrawler(dict(self.config, crawl_pattern='priority', threads=1, delay=0, breadth=2,
+                                          priority_patterns={'/docs/': 5, r'\?sort=': -5}))
+        order = []
+
+        def fake_process_url(url, depth):
+            order.append(url)
+            if url == 'https://example.com':
+                return ['https://example.com/list?sort=asc', 'https://example.com/about', 'https://example.com/docs/'], 'Title'
+            return [], 'Title'
+
+        crawler.process_url = fake_process_url
+        with patch.object(crawler, 'save_state'):
+            crawler.crawl()
+
+        self.assertEqual(order, ['https://example.com', 'https://example.com/docs/', 'https://example.com/about'])
+
+    def test_crawl_priority_prefers_high_value_links_found_later(self):
+        crawler = AdvancedWebCrawler(dict(self.config, crawl_pattern='priority', threads=1, delay=0, depth=2,
+                                          breadth=5, priority_patterns={'/docs': 10}))
+        order = []
+
+        def fake_process_url(url, depth):
+            order.append(url)
+            if url == 'https://example.com':
+                return [f'https://example.com/p{i}' for i in range(5)], 'Title'
+            if url == 'https://example.com/p0':
+                return ['https://example.com/docs'], 'Title'
+            return [], 'Title'
+
+        crawler.process_url = fake_process_url
+        with patch.object(crawler, 'save_state'):
+            crawler.crawl()
+
+        self.assertEqual(order[:3], ['https://example.com', 'https://example.com/p0', 'https://example.com/docs'])
+        self.assertEqual(len(order), 7)
+
+    def test_host_page_budget(self):
+        self.crawler.config['host_page_budget'] = 2
+        self.crawler.config['delay'] = 0
+        crawled = []
+
+        def fake_process_url(url, depth):
+            crawled.append(url)
+            return [f'https://example.com/{i}' for i in range(5)] + ['https://other.example/'], 'Title'
+
+        self.crawler.process_url = fake_process_url
+        self.crawler.crawl_breadth_first()
+
+        self.assertEqual(len([url for url in crawled if url.startswith('https://example.com')]), 2)
+        self.assertIn('https://other.example/', crawled)
+
+    def test_plugins_can_adjust_url_scores(self):
+        plugin = Mock(spec=['score_url'])
+        plugin.score_url.side_effect = lambda url, depth, score: score + 10 if url.endswith('/boost') else score
+        self.crawler.plugins = [plugin]
+        self.assertEqual(self.crawler.scorer.score('https://example.com/boost', 1) - self.crawler.scorer.score('https://example.com/x', 1), 10)
+
+    def test_crawl_with_async_engine(self):
+        self.crawler.config['engine'] = 'async'
+        self.crawler.config['depth'] = 1
+        self.crawler.config['delay'] = 0
+        crawled = set()
+
+        async def fake_process_url_async(session, url, depth):
+            await asyncio.sleep(0)
+            crawled.add(url)
+            return [f'https://example.com/page{i}' for i in range(3)], 'Title'
+
+        self.crawler.process_url_async = fake_process_url_async
+        self.crawler.crawl_breadth_first()
+
+        self.assertEqual(crawled, {
+            'https://example.com',
+            'https://example.com/page0',
+            'https://example.com/page1',
+            'https://example.com/page2',
+        })
+        self.assertGreater(self.crawler.metrics.snapshot()['stage_cpu_seconds']['fetch'], 0)
+
+    def test_crawl_delay_is_enforced_per_host(self):
+        self.crawler.config['delay'] = 0.2
+        started = {}
+
+        def fake_process_url(url, depth):
+            started[url] = time.monotonic()
+            if depth == 0:
+                return ['https://example.com/a', 'https://other.example/a'], 'Title'
+            return [], 'Title'
+
+        self.crawler.process_url = fake_process_url
+        self.crawler.crawl_breadth_first()
+
+        self.assertGreaterEqual(started['https://example.com/a'] - started['https://example.com'], 0.15)
+        self.assertLess(started['https://other.example/a'] - started['https://example.com'], 0.15)
+
+    def test_slow_host_gets_one_request_at_a_time(self):
+        self.crawler.config['delay'] = 0.1
+        self.crawler.config['threads'] = 5
+        lock = threading.Lock()
+        active = []
+        spans = []
+
+        def fake_process_url(url, depth):
+            with lock:
+                active.append(url)
+                concurrent = len(active)
+            started = time.monotonic()
+            time.sleep(0.15)
+            with lock:
+                active.remove(url)
+                spans.append((started, time.monotonic(), concurrent))
+            if depth == 0:
+                return [f'https://example.com/{i}' for i in range(3)], 'Title'
+            return [], 'Title'
+
+        self.crawler.process_url = fake_process_url
+        self.crawler.crawl_breadth_first()
+
+        spans.sort()
+        self.assertEqual(len(spans), 4)
+        self.assertEqual(max(concurrent for _, _, concurrent in spans), 1)
+        for (_, finished, _), (started, _, _) in zip(spans, spans[1:]):
+            self.assertGreaterEqual(started - finished, 0.09)
+
+    def test_get_crawl_delay_honours_robots(self):
+        self.crawler.rp = Mock()
+        self.crawler.rp.crawl_delay.side_effect = lambda useragent, url: 5 if 'example.com' in url else None
+        self.assertEqual(self.crawler.get_crawl_delay('https://example.com/page'), 5)
+        self.assertEqual(self.crawler.get_crawl_delay('https://other.example/page'), 1)
+
+    def test_crawl_with_sqlite_frontier(self):
+        with tempfile.TemporaryDirectory() as temp_dir:
+            self.crawler.config.update({'delay': 0, 'depth': 1, 'frontier': 'sqlite',
+                                        'frontier_path': os.path.join(temp_dir, 'frontier.db')})
+            self.crawler.frontier = self.crawler.setup_frontier()
+            self.crawler.frontier.push('https://example.com', 0)
+            crawled = []
+
+            def fake_process_url(url, depth):
+                crawled.append(url)
+                return ['https://example.com/a', 'https://example.com/a', 'https://example.com/b'], 'Title'
+
+            self.crawler.process_url = fake_process_url
+            self.crawler.crawl_breadth_first()
+
+            self.assertEqual(crawled, ['https://example.com', 'https://example.com/a', 'https://example.com/b'])
+            self.assertEqual(len(self.crawler.frontier), 0)
+
+    def test_enqueue_deduplicates_canonical_urls(self):
+        self.crawler.enqueue_links(['https://example.com/a?y=2&x=1', 'https://EXAMPLE.com/a?x=1&y=2#top',
+                                    'https://example.com:443/'], 1)
+        self.assertEqual(self.crawler.frontier.snapshot(), [('https://example.com', 0), ('https://example.com/a?y=2&x=1', 1)])
+
+    def test_bloom_seen_store(self):
+        self.crawler.config['seen_store'] = 'bloom'
+        self.assertIsInstance(self.crawler.setup_seen_store(), BloomURLSeenStore)
+        self.crawler.config['seen_store'] = 'invalid'
+        with self.assertRaises(ValueError):
+            self.crawler.setup_seen_store()
+
+    def test_crawl_with_disk_frontier(self):
+        with tempfile.TemporaryDirectory() as temp_dir:
+            self.crawler.config.update({'delay': 0, 'depth': 1, 'frontier': 'disk', 'frontier_path': temp_dir,
+                                        'frontier_segment_size': 2})
+            self.crawler.frontier = self.crawler.setup_frontier()
+            self.crawler.frontier.push('https://example.com', 0)
+            crawled = []
+
+            def fake_process_url(url, depth):
+                crawled.append(url)
+                return [f'https://example.com/{i}' for i in range(5)], 'Title'
+
+            self.crawler.process_url = fake_process_url
+            self.crawler.crawl_breadth_first()
+
+            self.assertEqual(len(crawled), 6)
+            self.assertEqual(len(self.crawler.frontier), 0)
+
+    def test_unsupported_frontier(self):
+        self.crawler.config['frontier'] = 'invalid'
+        with self.assertRaises(ValueError):
+            self.crawler.setup_frontier()
+
+    def test_unsupported_engine(self):
+        self.crawler.config['engine'] = 'invalid'
+        with self.assertRaises(ValueError):
+            self.crawler.crawl_breadth_first()
+
+class TestAnalyzeHtml(unittest.TestCase):
+
+    def test_analyze_html(self):
+        content = '<html><head><title>Home</title><meta property="og:type" content="website">' \
+                  '<style>body {}</style></head><body><p>Hello</p><script>var x;</script>' \
+                  '<a href="page2">Link</a><a href="mailto:me@example.com">Mail</a></body></html>'
+        page = analyze_html('https://example.com/dir/', content)
+        self.assertEqual(page.title, 'Home')
+        self.assertEqual(page.links, ['https://example.com/dir/page2'])
+        self.assertEqual(page.metadata, {'og:type': 'website'})
+        self.assertEqual(page.text, 'Home Hello Link Mail')
+
+    def test_missing_title(self):
+        self.assertEqual(analyze_html('https://example.com', '<p>Hi</p>').title, 'No title')
+
+class TestChangeIndex(unittest.TestCase):
+
+    def setUp(self):
+        self.temp_dir = tempfile.TemporaryDirectory()
+        self.filename = os.path.join(self.temp_dir.name, 'changes.db')
+        self.text = ' '.join(f'token{chr(97 + i % 26)}{chr(97 + i // 26)}' for i in range(300))
+
+    def tearDown(self):
+        self.temp_dir.cleanup()
+
+    def test_ignores_boilerplate_churn(self):
+        index = ChangeIndex(self.filename)
+        self.assertFalse(index.record('https://example.com', *content_signature('a', self.text)))
+        self.assertFalse(index.record('https://example.com', *content_signature('b', self.text + ' 2024-05-01 12:03')))
+
+    def test_detects_real_changes_and_survives_restart(self):
+        index = ChangeIndex(self.filename)
+        index.record('https://example.com', *content_signature('a', self.text))
+        index.conn.close()
+
+        reopened = ChangeIndex(self.filename)
+        changed_text = ' '.join(f'other{i}' for i in range(300))
+        self.assertTrue(reopened.record('https://example.com', *content_signature('b', changed_text)))
+        self.assertFalse(reopened.record('https://example.com', *content_signature('b', changed_text)))
+
+    def test_find_near_duplicate(self):
+        index = ChangeIndex(self.filename)
+        index.record('https://example.com/a', *content_signature('a', self.text))
+        self.assertIsNone(index.find_near_duplicate('https://example.com/b', simhash(self.text)))
+        index.mark_written('https://example.com/a')
+        self.assertEqual(index.find_near_duplicate('https://example.com/b', simhash(self.text)), 'https://example.com/a')
+        self.assertIsNone(index.find_near_duplicate('https://example.com/a', simhash(self.text)))
+        self.assertIsNone(index.find_near_duplicate('https://example.com/b', simhash('completely different words here')))
+
+    def test_revisit_interval_adapts_to_change_rate(self):
+        index = ChangeIndex(self.filename, revisit_interval=100, min_revisit_interval=50, max_revisit_interval=400)
+        index.record_revisit('https://example.com', '"v1"', None, [], False)
+        self.assertEqual(index.get_revisit('https://example.com')['interval'], 100)
+
+        index.record_not_modified('https://example.com')
+        index.record_not_modified('https://example.com')
+        index.record_not_modified('https://example.com')
+        self.assertEqual(index.get_revisit('https://example.com')['interval'], 400)
+
+        index.record_revisit('https://example.com', '"v2"', None, [], True)
+        revisit = index.get_revisit('https://example.com')
+        self.assertEqual(revisit['interval'], 200)
+        self.assertEqual(revisit['etag'], '"v2"')
+        self.assertGreater(revisit['next_visit'], time.time() + 150)
+        self.assertIsNone(index.get_revisit('https://example.com/other'))
+
+class TestRobotsCache(unittest.TestCase):
+
+    def setUp(self):
+        self.session = Mock()
+        self.session.get.return_value = Mock(status_code=200, text='User-agent: *\nDisallow: /private\nCrawl-delay: 3')
+        self.cache = RobotsCache(self.session, Mock(), ttl=60, max_size=2)
+
+    def test_fetches_once_per_origin(self):
+        self.assertTrue(self.cache.can_fetch('*', 'https://example.com/page'))
+        self.assertFalse(self.cache.can_fetch('*', 'https://example.com/private'))
+        self.session.get.assert_called_once_with('https://example.com/robots.txt', timeout=5)
+
+        self.cache.can_fetch('*', 'http://example.com/page')
+        self.assertEqual(self.session.get.call_count, 2)
+
+    def test_crawl_delay_only_uses_cached_rules(self):
+        self.assertIsNone(self.cache.crawl_delay('*', 'https://example.com/page'))
+        self.cache.get('https://example.com/page')
+        self.assertEqual(self.cache.crawl_delay('*', 'https://example.com/page'), 3)
+
+    def test_expired_entries_are_refetched(self):
+        self.cache.ttl = 0
+        self.cache.get('https://example.com/')
+        self.cache.get('https://example.com/')
+        self.assertEqual(self.session.get.call_count, 2)
+
+    def test_least_recently_used_origin_is_evicted(self):
+        self.cache.get('https://a.example/')
+        self.cache.get('https://b.example/')
+        self.cache.get('https://a.example/')
+        self.cache.get('https://c.example/')
+        self.assertEqual(list(self.cache.parsers), ['https://a.example', 'https://c.example'])
+
+    def test_status_codes(self):
+        self.session.get.return_value = Mock(status_code=403, text='')
+        self.assertFalse(self.cache.can_fetch('*', 'https://forbidden.example/page'))
+        self.session.get.return_value = Mock(status_code=404, text='')
+        self.assertTrue(self.cache.can_fetch('*', 'https://missing.example/page'))
+
+    def test_concurrent_lookups_share_one_fetch(self):
+        def slow_get(url, timeout):
+            time.sleep(0.05)
+            return Mock(status_code=200, text='')
+
+        self.session.get.side_effect = slow_get
+        threads = [threading.Thread(target=self.cache.get, args=('https://example.com/',)) for _ in range(5)]
+        for thread in threads:
+            thread.start()
+        for thread in threads:
+            thread.join()
+        self.session.get.assert_called_once()
+
+class FakeTextCat:
+    # Stands in for nltk's TextCat; corpus stands in for the crubadan corpus reader
+    PROFILES = {
+        'eng': ['<th', 'the', 'he>', '<an', 'and', 'nd>'],
+        'fra': ['<le', 'le>', '<et', 'et>', '<de', 'de>'],
+        'deu': ['<de', 'der', 'er>', '<un', 'und', 'nd>'],
+    }
+
+    def __init__(self):
+        self.corpus = Mock()
+        self.corpus.langs.return_value = list(self.PROFILES)
+        self.corpus.lang_freq.side_effect = lambda language: dict.fromkeys(self.PROFILES[language])
+
+    def profile(self, text):
+        trigrams = {}
+        for token in text.split():
+            token = f'<{token}>'
+            for i in range(len(token) - 2):
+                trigrams[token[i:i + 3]] = trigrams.get(token[i:i + 3], 0) + 1
+        return trigrams
+
+    def classify(self, text):
+        # The reference out-of-place measure from nltk
+        profile = list(self.profile(text))
+        distances = {}
+        for language, trigrams in self.PROFILES.items():
+            distances[language] = sum(abs(trigrams.index(t) - profile.index(t)) if t in trigrams else sys.maxsize
+                                      for t in profile)
+        return min(distances, key=distances.get)
+
+class TestTextClassifier(unittest.TestCase):
+
+    def setUp(self):
+        self.textcat = FakeTextCat()
+        self.profiles = LanguageProfiles(self.textcat, self.textcat.corpus)
+
+    def test_matches_textcat(self):
+        for text in ('the cat and the hat', 'le chat et le chien de paris', 'der hund und die katze', 'zzz', ''):
+            self.assertEqual(self.profiles.classify(text), self.textcat.classify(text), text)
+
+    def test_samples_long_text(self):
+        classifier = TextClassifier(self.profiles, sample_chars=20)
+        sample = classifier.sample('alpha ' * 5 + 'middle words here ' + 'omega ' * 5)
+        self.assertLessEqual(len(sample), 20)
+        self.assertNotIn('  ', sample)
+        self.assertEqual(sample, sample.strip())
+        self.assertEqual(classifier.sample('short text'), 'short text')
+
+    def test_caches_by_content(self):
+        classifier = TextClassifier(self.profiles, cache_size=2)
+        with patch.object(self.profiles, 'classify', wraps=self.profiles.classify) as classify:
+            self.assertEqual([classifier.classify(text) for text in ('the and', 'le et', 'the and')], ['eng', 'fra', 'eng'])
+            self.assertEqual(classify.call_count, 2)
+            classifier.classify('le et')
+            self.assertEqual(classify.call_count, 2)
+            classifier.classify('der und')
+            classifier.classify('the and')
+            self.assertEqual(classify.call_count, 4)
+
+class TestCrawlMetrics(unittest.TestCase):
+
+    def test_snapshot_and_histograms(self):
+        metrics = CrawlMetrics(max_hosts=1)
+        metrics.increment('pages', 2)
+        metrics.observe_fetch('https://example.com/a', 0.2, 1000)
+        metrics.observe_fetch('https://other.example/b', 3, 500)
+        with metrics.time_stage('parse'):
+            pass
+        metrics.set_gauge('frontier_size', 7)
+
+        snapshot = metrics.snapshot()
+        self.assertEqual(snapshot['pages'], 2)
+        self.assertEqual(snapshot['bytes'], 1500)
+        self.assertGreater(snapshot['pages_per_second'], 0)
+        self.assertEqual(snapshot['gauges'], {'frontier_size': 7})
+        self.assertEqual(set(snapshot['host_latency']), {'example.com', 'other'})
+        fetch = snapshot['stages']['fetch']
+        self.assertEqual(fetch['count'], 2)
+        self.assertEqual(fetch['buckets']['0.1'], 0)
+        self.assertEqual(fetch['buckets']['0.25'], 1)
+        self.assertEqual(fetch['buckets']['+Inf'], 2)
+        self.assertEqual(snapshot['stages']['parse']['count'], 1)
+
+    def test_pass_snapshot_counts_only_the_current_pass(self):
+        metrics = CrawlMetrics()
+        metrics.increment('pages', 3)
+        metrics.observe_fetch('https://example.com/a', 0.2, 1000)
+        metrics.start_pass()
+        metrics.increment('pages', 2)
+        metrics.observe_fetch('https://example.com/b', 0.5, 200)
+
+        current = metrics.pass_snapshot()
+        self.assertEqual(current['pages'], 2)
+        self.assertEqual(current['bytes'], 200)
+        self.assertEqual(current['stages']['fetch']['count'], 1)
+        self.assertAlmostEqual(current['stages']['fetch']['sum'], 0.5)
+        self.assertLess(current['elapsed_seconds'], metrics.snapshot()['elapsed_seconds'])
+        # Exported totals keep counting across passes
+        self.assertEqual(metrics.snapshot()['pages'], 5)
+        self.assertIn('crawler_pages_total 5', metrics.render_prometheus())
+
+    def test_prometheus_endpoint(self):
+        metrics = CrawlMetrics()
+        metrics.increment('pages')
+        metrics.observe_fetch('https://example.com/a', 0.2, 1000)
+        server = MetricsServer(('127.0.0.1', 0), metrics)
+        threading.Thread(target=server.serve_forever, daemon=True).start()
+        try:
+            with urllib.request.urlopen(f'http://127.0.0.1:{server.server_port}/metrics') as response:
+                body = response.read().decode('utf-8')
+        finally:
+            server.shutdown()
+            server.server_close()
+
+        self.assertIn('crawler_pages_total 1\n', body)
+        self.assertIn('crawler_bytes_total 1000\n', body)
+        self.assertIn('crawler_stage_seconds_bucket{stage="fetch",le="0.25"} 1\n', body)
+        self.assertIn('crawler_fetch_seconds_count{host="example.com"} 1\n', body)
+
+class TestBodyDecoder(unittest.TestCase):
+
+    def test_decodes_incrementally_across_chunk_boundaries(self):
+        body = 'caf\u00e9 \u2603'.encode('utf-8')
+        decoder = BodyDecoder('text/html; charset=utf-8')
+        for i in range(len(body)):
+            decoder.feed(body[i:i + 1])
+        self.assertEqual(decoder.finish(), 'caf\u00e9 \u2603')
+
+    def test_sniffs_meta_charset(self):
+        body = '<html><head><meta charset="iso-8859-1"></head><body>caf\u00e9</body></html>'.encode('iso-8859-1')
+        decoder = BodyDecoder('text/html')
+        decoder.feed(body[:20])
+        decoder.feed(body[20:])
+        self.assertIn('caf\u00e9', decoder.finish())
+
+    def test_enforces_max_bytes(self):
+        decoder = BodyDecoder('text/html', max_bytes=10)
+        decoder.feed(b'0123456789')
+        with self.assertRaises(ResponseTooLarge):
+            decoder.feed(b'x')
+
+class TestBrowserPool(unittest.TestCase):
+
+    def setUp(self):
+        self.drivers = []
+
+    def make_driver(self):
+        driver = Mock(page_source='<html></html>', title='Rendered')
+        driver.execute_script.return_value = ['complete', 3]
+        self.drivers.append(driver)
+        return driver
+
+    def test_reuses_and_recycles_browsers(self):
+        pool = BrowserPool(size=1, max_pages=2, idle_time=0, driver_factory=self.make_driver)
+        for i in range(3):
+            self.assertEqual(pool.fetch(f'https://example.com/{i}'), ('<html></html>', 'Rendered'))
+
+        self.assertEqual(len(self.drivers), 2)
+        self.drivers[0].quit.assert_called_once()
+        self.drivers[1].quit.assert_not_called()
+        pool.close()
+        self.drivers[1].quit.assert_called_once()
+
+    def test_replaces_crashed_browser(self):
+        pool = BrowserPool(size=1, idle_time=0, driver_factory=self.make_driver)
+        pool.fetch('https://example.com')
+        self.drivers[0].get.side_effect = WebDriverException('crashed')
+        with self.assertRaises(WebDriverException):
+            pool.fetch('https://example.com')
+        pool.fetch('https://example.com')
+
+        self.assertEqual(len(self.drivers), 2)
+        self.drivers[0].quit.assert_called_once()
+
+    def test_waits_for_resources_to_settle(self):
+        driver = self.make_driver()
+        driver.execute_script.side_effect = [['loading', 0], ['complete', 1], ['complete', 2], ['complete', 2]]
+        pool = BrowserPool(idle_time=0, driver_factory=lambda: driver)
+        pool.fetch('https://example.com')
+        self.assertEqual(driver.execute_script.call_count, 4)
+
+    def test_looks_js_dependent(self):
+        article = '<html><body><p>' + 'Plenty of server rendered text. ' * 20 + '</p><script>track()</script></body></html>'
+        self.assertFalse(looks_js_dependent(article))
+        self.assertFalse(looks_js_dependent('<html><body><p>Short static page</p></body></html>'))
+        self.assertTrue(looks_js_dependent('<html><body><div id="root"></div><script src="app.js"></script></body></html>'))
+        self.assertTrue(looks_js_dependent(article.replace('<body>', '<body><noscript>Please enable JavaScript</noscript>')))
+        self.assertTrue(looks_js_dependent('<html><body><p>Loading</p><script src="app.js"></script></body></html>'))
+
+class TestURLSeenStore(unittest.TestCase):
+
+    def test_canonicalize_url(self):
+        self.assertEqual(canonicalize_url('HTTP://Example.COM:80/Path?b=2&a=1#frag'), 'http://example.com/Path?a=1&b=2')
+        self.assertEqual(canonicalize_url('https://example.com'), 'https://example.com/')
+
+    def test_exact_store(self):
+        store = URLSeenStore()
+        self.assertTrue(store.add('https://example.com/a'))
+        self.assertFalse(store.add('https://example.com/a#section'))
+        self.assertIn('https://example.com/a', store)
+        self.assertNotIn('https://example.com/b', store)
+        self.assertEqual(len(store), 1)
+
+    def test_bloom_store_scales_and_bounds_false_positives(self):
+        store = BloomURLSeenStore(capacity=1000, error_rate=0.01)
+        urls = [f'https://example.com/{i}' for i in range(5000)]
+        for url in urls:
+            store.add(url)
+
+        self.assertGreater(len(store.filters), 1)
+        self.assertTrue(all(url in store for url in urls))
+        false_positives = sum(f'https://other.example/{i}' in store for i in range(5000))
+        self.assertLess(false_positives / 5000, 0.02)
+
+class TestDiskFrontier(unittest.TestCase):
+
+    def setUp(self):
+        self.temp_dir = tempfile.TemporaryDirectory()
+        self.frontier = DiskFrontier(self.temp_dir.name, segment_size=3)
+        for i in range(10):
+            self.frontier.push(f'https://example.com/{i}', 0)
+
+    def tearDown(self):
+        self.temp_dir.cleanup()
+
+    def drain(self, frontier, lifo=False):
+        urls = []
+        while (entry := frontier.pop(lifo)) is not None:
+            urls.append(entry[0])
+        return urls
+
+    def test_spills_to_disk_and_keeps_fifo_order(self):
+        self.assertEqual(len(self.frontier), 10)
+        self.assertEqual(len(self.frontier.segments), 3)
+        self.assertLessEqual(len(self.frontier.head) + len(self.frontier.tail), 3)
+        self.assertEqual(self.drain(self.frontier), [f'https://example.com/{i}' for i in range(10)])
+        self.assertEqual(len(os.listdir(self.temp_dir.name)), 3)
+        self.frontier.commit()
+        self.assertEqual(os.listdir(self.temp_dir.name), [])
+
+    def test_keeps_lifo_order(self):
+        self.assertEqual(self.drain(self.frontier, lifo=True), [f'https://example.com/{i}' for i in reversed(range(10))])
+
+    def test_snapshot_and_restore(self):
+        self.frontier.pop()
+        self.frontier.pop()
+        self.frontier.pop()
+        self.frontier.pop()
+        restored = DiskFrontier(self.temp_dir.name, segment_size=3)
+        with patch('crawler.pickle.load') as mock_load:
+            restored.restore(self.frontier.snapshot())
+        # Segment sizes come from the snapshot, so nothing is read until a segment is popped
+        mock_load.assert_not_called()
+        self.assertEqual(len(restored), 6)
+        self.assertEqual(self.drain(restored), [f'https://example.com/{i}' for i in range(4, 10)])
+
+class TestSQLiteFrontier(unittest.TestCase):
+
+    def setUp(self):
+        self.temp_dir = tempfile.TemporaryDirectory()
+        self.filename = os.path.join(self.temp_dir.name, 'frontier.db')
+
+    def tearDown(self):
+        self.temp_dir.cleanup()
+
+    def test_push_pop_ack(self):
+        frontier = SQLiteFrontier(self.filename)
+        frontier.push('https://example.com/a', 0)
+        frontier.push('https://example.com/b', 1)
+        frontier.push('https://example.com/a', 1)
+
+        self.assertEqual(len(frontier), 2)
+        self.assertEqual(frontier.pop(lifo=True), ('https://example.com/b', 1))
+        self.assertEqual(frontier.pop(), ('https://example.com/a', 0))
+        self.assertIsNone(frontier.pop())
+
+        frontier.ack('https://example.com/a')
+        frontier.ack('https://example.com/b')
+        self.assertEqual(len(frontier), 0)
+
+    def test_later_pass_requeues_finished_urls(self):
+        frontier = SQLiteFrontier(self.filename)
+        frontier.push('https://example.com/a', 0)
+        frontier.push('https://example.com/b', 1)
+        frontier.pop()
+        frontier.ack('https://example.com/a')
+
+        frontier.generation = 1
+        frontier.push('https://example.com/a', 0)
+        frontier.push('https://example.com/a', 2)
+        self.assertEqual(len(frontier), 2)
+        self.assertEqual(frontier.pop(), ('https://example.com/b', 1))
+        self.assertEqual(frontier.pop(), ('https://example.com/a', 0))
+
+    def test_urls_are_partitioned_by_host(self):
+        nodes = [SQLiteFrontier(self.filename, node_id=node_id, nodes=2) for node_id in range(2)]
+        urls = [f'https://host{i}.example/' for i in range(10)]
+        for url in urls:
+            nodes[0].push(url, 0)
+
+        popped = {node_id: [] for node_id in range(2)}
+        for node_id, node in enumerate(nodes):
+            while (entry := node.pop()) is not None:
+                popped[node_id].append(entry[0])
+                self.assertEqual(node.partition(entry[0]), node_id)
+        self.assertCountEqual(popped[0] + popped[1], urls)
+
+    def test_expired_leases_are_reclaimed(self):
+        frontier = SQLiteFrontier(self.filename, lease_timeout=-1)
+        frontier.push('https://example.com/a', 0)
+        self.assertEqual(frontier.pop(), ('https://example.com/a', 0))
+
+        other = SQLiteFrontier(self.filename)
+        other.owner = 'other-node'
+        self.assertEqual(other.pop(), ('https://example.com/a', 0))
+        frontier.ack('https://example.com/a')
+        self.assertEqual(len(other), 1)
+        other.ack('https://example.com/a')
+        self.assertEqual(len(other), 0)
+
+    def test_stopped_node_partition_is_taken_over(self):
+        live = SQLiteFrontier(self.filename, node_id=0, nodes=2)
+        stopped = SQLiteFrontier(self.filename, node_id=1, nodes=2)
+        live.push('https://b.example/', 0)
+        self.assertEqual(stopped.partition('https://b.example/'), 1)
+        # Node 1 is still polling, so its hosts stay its own
+        self.assertIsNone(live.pop())
+
+        stopped.conn.execute('UPDATE nodes SET last_seen = 0 WHERE node_id = 1')
+        self.assertEqual(live.pop(), ('https://b.example/', 0))
+        live.ack('https://b.example/')
+        self.assertEqual(len(live), 0)
+
+class TestPriorityFrontier(unittest.TestCase):
+
+    def setUp(self):
+        self.frontier = PriorityFrontier(lambda url, depth, inlinks: inlinks - depth)
+
+    def test_pops_highest_score_first(self):
+        self.frontier.push('https://example.com/deep', 3)
+        self.frontier.push('https://example.com/a', 1)
+        self.frontier.push('https://example.com/b', 1)
+        self.assertEqual([self.frontier.pop()[0] for _ in range(3)],
+                         ['https://example.com/a', 'https://example.com/b', 'https://example.com/deep'])
+        self.assertIsNone(self.frontier.pop())
+
+    def test_inlinks_reprioritize_queued_urls(self):
+        self.frontier.push('https://example.com/a', 1)
+        self.frontier.push('https://example.com/b', 1)
+        self.frontier.note_links(['https://example.com/b', 'https://example.com/b', 'https://example.com/new'])
+        self.assertEqual(len(self.frontier), 2)
+        self.assertEqual(self.frontier.pop(), ('https://example.com/b', 1))
+        self.assertEqual(self.frontier.pop(), ('https://example.com/a', 1))
+
+        # In-links seen before a URL is queued still count
+        self.frontier.push('https://example.com/new', 2)
+        self.frontier.push('https://example.com/c', 1)
+        self.assertEqual(self.frontier.pop(), ('https://example.com/new', 2))
+
+    def test_snapshot_and_restore(self):
+        self.frontier.push('https://example.com/deep', 3)
+        self.frontier.push('https://example.com/a', 1)
+        snapshot = self.frontier.snapshot()
+        self.assertEqual(snapshot, [('https://example.com/a', 1), ('https://example.com/deep', 3)])
+
+        restored = PriorityFrontier(lambda url, depth, inlinks: -depth)
+        restored.restore(snapshot)
+        self.assertEqual(restored.pop(), ('https://example.com/a', 1))
+
+class TestProxyPool(unittest.TestCase):
+
+    def setUp(self):
+        self.proxies = ['http://a:8080', 'http://b:8080', 'http://c:8080']
+        self.pool = ProxyPool(self.proxies, session_factory=Mock, failure_threshold=2, base_backoff=10,
+                              max_backoff=25, rng=random.Random(0))
+
+    def test_prefers_fast_and_reliable_proxies(self):
+        self.pool.record_success('http://a:8080', 0.1)
+        self.pool.record_success('http://b:8080', 2.0)
+        self.pool.record_success('http://c:8080', 0.1)
+        self.pool.record_failure('http://c:8080')
+        picks = collections.Counter(self.pool.choose() for _ in range(300))
+        self.assertGreater(picks['http://a:8080'], picks['http://c:8080'])
+        self.assertGreater(picks['http://c:8080'], picks['http://b:8080'])
+        self.assertEqual(self.pool.choose(exclude=['http://a:8080', 'http://b:8080']), 'http://c:8080')
+        self.assertIsNone(self.pool.choose(exclude=self.proxies))
+
+    def test_ejects_failing_proxies_with_backoff(self):
+        session = self.pool.session('http://a:8080')
+        self.assertEqual(session.proxies, {'http': 'http://a:8080', 'https': 'http://a:8080'})
+        self.assertIs(self.pool.session('http://a:8080'), session)
+
+        self.assertFalse(self.pool.record_failure('http://a:8080'))
+        with patch('crawler.time.monotonic', return_value=100):
+            self.assertTrue(self.pool.record_failure('http://a:8080'))
+        self.assertEqual(self.pool.ejected_until['http://a:8080'], 110)
+        session.close.assert_called_once()
+        self.assertIsNot(self.pool.session('http://a:8080'), session)
+
+        with patch('crawler.time.monotonic', return_value=105):
+            self.assertNotIn('http://a:8080', {self.pool.choose() for _ in range(50)})
+            self.assertEqual(self.pool.healthy_count(), 2)
+            self.assertEqual(self.pool.choose(exclude=['http://b:8080', 'http://c:8080']), 'http://a:8080')
+
+        for now in (200, 201, 300, 301):
+            with patch('crawler.time.monotonic', return_value=now):
+                self.pool.record_failure('http://a:8080')
+        self.assertEqual(self.pool.ejected_until['http://a:8080'], 301 + 25)
+
+        self.pool.record_success('http://a:8080', 0.5)
+        self.assertEqual(self.pool.ejections['http://a:8080'], 0)
+
+class TestHostScheduler(unittest.TestCase):
+
+    def test_hosts_are_delayed_independently(self):
+        scheduler = HostScheduler(lambda url: 10)
+        scheduler.add('https://a.example/1', 0)
+        scheduler.add('https://a.example/2', 0)
+        scheduler.add('https://b.example/1', 0)
+
+        self.assertEqual(scheduler.pop_ready(100), ('https://a.example/1', 0))
+        self.assertEqual(scheduler.pop_ready(100), ('https://b.example/1', 0))
+        self.assertIsNone(scheduler.pop_ready(100))
+        # The delay only starts once the host's request has finished
+        self.assertIsNone(scheduler.time_until_ready(100))
+        self.assertIsNone(scheduler.pop_ready(1000))
+        scheduler.release('https://a.example/1', 105)
+        self.assertEqual(scheduler.time_until_ready(105), 10)
+        self.assertIsNone(scheduler.pop_ready(114))
+        self.assertEqual(scheduler.pop_ready(115), ('https://a.example/2', 0))
+        self.assertEqual(len(scheduler), 0)
+
+    def test_is_full(self):
+        scheduler = HostScheduler(lambda url: 0, max_pending=1)
+        self.assertFalse(scheduler.is_full())
+        scheduler.add('https://a.example/1', 0)
+        self.assertTrue(scheduler.is_full())
+        self.assertIn('https://a.example/1', scheduler)
+
+class TestPluginPipeline(unittest.TestCase):
+
+    def setUp(self):
+        self.metrics = CrawlMetrics()
+        self.logger = Mock()
+
+    def test_batch_and_async_plugins(self):
+        batches = []
+        pages = []
+
+        class BatchPlugin:
+            def process_batch(self, items):
+                batches.append([url for url, content, page, category in items])
+
+        class AsyncPlugin:
+            async def process_page(self, url, content, page, category):
+                await asyncio.sleep(0)
+                if url.endswith('/2'):
+                    raise ValueError('bad page')
+                pages.append(url)
+
+        pipeline = PluginPipeline([BatchPlugin(), AsyncPlugin()], self.logger, self.metrics, batch_size=2,
+                                  flush_interval=5)
+        for i in range(5):
+            pipeline.submit(f'https://example.com/{i}', '', Mock(), 'en')
+        pipeline.close()
+
+        self.assertEqual(batches, [['https://example.com/0', 'https://example.com/1'],
+                                   ['https://example.com/2', 'https://example.com/3'], ['https://example.com/4']])
+        self.assertEqual(sorted(pages), ['https://example.com/0', 'https://example.com/1', 'https://example.com/3',
+                                         'https://example.com/4'])
+        self.assertEqual(self.metrics.counters['plugin_errors'], 1)
+        self.logger.error.assert_called_once()
+
+    def test_slow_plugin_applies_backpressure_without_blocking_others(self):
+        release = threading.Event()
+        fast_pages = []
+        slow = Mock(spec=['process'])
+        slow.process.side_effect = lambda *args: release.wait(5)
+        fast = Mock(spec=['process_page'])
+        fast.process_page.side_effect = lambda url, *args: fast_pages.append(url)
+        pipeline = PluginPipeline([slow, fast], self.logger, self.metrics, queue_size=1)
+
+        pipeline.submit('https://example.com/0', '', Mock(), 'en')
+        pipeline.submit('https://example.com/1', '', Mock(), 'en')
+        blocked = threading.Thread(target=pipeline.submit, args=('https://example.com/2', '', Mock(), 'en'))
+        blocked.start()
+        blocked.join(0.2)
+        self.assertTrue(blocked.is_alive())
+        self.assertEqual(fast_pages, ['https://example.com/0', 'https://example.com/1'])
+
+        release.set()
+        blocked.join(5)
+        pipeline.close()
+        self.assertEqual(slow.process.call_count, 3)
+        self.assertEqual(len(fast_pages), 3)
+
+class TestChangeNotifier(unittest.TestCase):
+
+    @patch('crawler.smtplib.SMTP')
+    def test_coalesces_changes_into_digests_over_one_connection(self, mock_smtp):
+        notifier = ChangeNotifier('user@example.com', Mock(), digest_interval=60, digest_size=2)
+        notifier.notify('https://example.com/a', 'A')
+        notifier.notify('https://example.com/b', 'B')
+        notifier.notify('https://example.com/c', 'C')
+        notifier.close()
+
+        connection = mock_smtp.return_value
+        mock_smtp.assert_called_once()
+        bodies = [call.args[0].get_payload() for call in connection.send_message.call_args_list]
+        self.assertIn('https://example.com/a', ''.join(bodies))
+        self.assertIn('https://example.com/c', ''.join(bodies))
+        self.assertLessEqual(len(bodies), 2)
+        connection.quit.assert_called_once()
+
+    @patch('crawler.smtplib.SMTP')
+    def test_reconnects_when_server_dropped_the_connection(self, mock_smtp):
+        stale, fresh = Mock(), Mock()
+        stale.send_message.side_effect = smtplib.SMTPServerDisconnected('closed')
+        mock_smtp.side_effect = [stale, fresh]
+        notifier = ChangeNotifier('user@example.com', Mock())
+
+        notifier.send('Subject', 'Body')
+
+        self.assertEqual(mock_smtp.call_count, 2)
+        fresh.send_message.assert_called_once()
+        self.assertIs(notifier.smtp, fresh)
+
+    @patch('crawler.smtplib.SMTP')
+    def test_keeps_changes_when_sending_fails(self, mock_smtp):
+        mock_smtp.side_effect = ConnectionRefusedError()
+        logger = Mock()
+        notifier = ChangeNotifier('user@example.com', logger)
+        notifier.changes = [('https://example.com/a', 'A')]
+
+        notifier.send_digest()
+
+        logger.error.assert_called_once()
+        self.assertEqual(notifier.changes, [('https://example.com/a', 'A')])
+
 class TestOutputHandlers(unittest.TestCase):
 
     def test_csv_output_handler(self):
@@ -189,6 +1517,100 @@ class TestOutputHandlers(unittest.TestCase):
 
         os.unlink(temp_file.name)
 
+    def test_sqlite_output_handler_batches_and_flushes(self):
+        with tempfile.TemporaryDirectory() as temp_dir:
+            filename = os.path.join(temp_dir, 'output.db')
+            handler = SQLiteOutputHandler(filename, batch_size=3, flush_interval=60)
+            reader = sqlite3.connect(filename)
+            count = lambda: reader.execute('SELECT COUNT(*) FROM pages').fetchone()[0]
+
+            for i in range(4):
+                handler.write(f'https://example.com/{i}', 'Example', {}, 'Content', 'English')
+            handler.flush()
+            self.assertEqual(count(), 4)
+
+            handler.write('https://example.com/4', 'Example', {}, 'Content', 'English')
+            handler.close()
+            self.assertEqual(count(), 5)
+            self.assertEqual(reader.execute('PRAGMA journal_mode').fetchone()[0], 'wal')
+            reader.close()
+
+    def test_sqlite_output_handler_commits_after_interval(self):
+        with tempfile.TemporaryDirectory() as temp_dir:
+            filename = os.path.join(temp_dir, 'output.db')
+            handler = SQLiteOutputHandler(filename, batch_size=100, flush_interval=0.05)
+            handler.write('https://example.com', 'Example', {}, 'Content', 'English')
+            time.sleep(0.3)
+
+            reader = sqlite3.connect(filename)
+            self.assertEqual(reader.execute('SELECT COUNT(*) FROM pages').fetchone()[0], 1)
+            reader.close()
+            handler.close()
+
+    def test_jsonl_output_handler_compresses_and_rotates(self):
+        with tempfile.TemporaryDirectory() as temp_dir:
+            filename = os.path.join(temp_dir, 'results.jsonl.gz')
+            handler = JSONLinesOutputHandler(filename, compression='gzip', max_bytes=1)
+            handler.write('https://example.com/a', 'A', {'description': 'Test'}, 'Content', 'English')
+            handler.write('https://example.com/b', 'B', {}, 'Content', 'English')
+            handler.close()
+
+            self.assertEqual(sorted(os.listdir(temp_dir)),
+                             ['results-00001.jsonl.gz', 'results-00002.jsonl.gz', 'results.jsonl.gz'])
+            with gzip.open(filename, 'rt') as f:
+                self.assertEqual([json.loads(line)['url'] for line in f], ['https://example.com/a'])
+            with gzip.open(os.path.join(temp_dir, 'results-00001.jsonl.gz'), 'rt') as f:
+                record = json.loads(f.readline())
+            self.assertEqual(record['title'], 'B')
+            self.assertEqual(record['metadata'], {})
+
+    def test_parquet_output_handler(self):
+        import pyarrow.parquet
+        with tempfile.TemporaryDirectory() as temp_dir:
+            filename = os.path.join(temp_dir, 'results.parquet')
+            handler = ParquetOutputHandler(filename, row_group_size=2)
+            for i in range(3):
+                handler.write(f'https://example.com/{i}', 'Example', {'description': 'Test'}, 'Content', 'English')
+            handler.close()
+
+            parquet_file = pyarrow.parquet.ParquetFile(filename)
+            self.assertEqual(parquet_file.num_row_groups, 2)
+            table = parquet_file.read()
+            self.assertEqual(table.column('url').to_pylist(), [f'https://example.com/{i}' for i in range(3)])
+            self.assertEqual(json.loads(table.column('metadata')[0].as_py()), {'description': 'Test'})
+
+    def test_warc_output_handler(self):
+        with tempfile.TemporaryDirectory() as temp_dir:
+            filename = os.path.join(temp_dir, 'results.warc.gz')
+            handler = WARCOutputHandler(filename, compression='gzip')
+            handler.write('https://example.com', 'Example', {}, '<html>Content</html>', 'English')
+            handler.close()
+
+            with gzip.open(filename, 'rb') as f:
+                data = f.read()
+            records = [record for record in data.split(b'WARC/1.1\r\n') if record]
+            self.assertEqual([r.split(b'\r\n')[0] for r in records],
+                             [b'WARC-Type: warcinfo', b'WARC-Type: resource', b'WARC-Type: metadata'])
+            self.assertIn(b'WARC-Target-URI: https://example.com\r\n', records[1])
+            self.assertIn(b'Content-Length: 20\r\n\r\n<html>Content</html>\r\n\r\n', records[1])
+
+    def test_warc_output_handler_writes_http_responses(self):
+        with tempfile.TemporaryDirectory() as temp_dir:
+            filename = os.path.join(temp_dir, 'results.warc')
+            handler = WARCOutputHandler(filename)
+            headers = {'Content-Type': 'text/html; charset=iso-8859-1', 'Content-Encoding': 'gzip', 'ETag': '"abc"'}
+            handler.write('https://example.com', 'Example', {}, '<html>Café</html>', 'English', (200, headers))
+            handler.close()
+
+            with open(filename, 'rb') as f:
+                records = [record for record in f.read().split(b'WARC/1.1\r\n') if record]
+            self.assertEqual(records[1].split(b'\r\n')[0], b'WARC-Type: response')
+            self.assertIn(b'Content-Type: application/http; msgtype=response\r\n', records[1])
+            http_message = records[1].split(b'\r\n\r\n', 1)[1]
+            self.assertEqual(http_message, b'HTTP/1.1 200 OK\r\nETag: "abc"\r\n'
+                                           b'Content-Type: text/html; charset=utf-8\r\nContent-Length: 18\r\n\r\n'
+                                           b'<html>Caf\xc3\xa9</html>\r\n\r\n')
+
 class TestConfigLoader(unittest.TestCase):
 
     def test_load_config(self):